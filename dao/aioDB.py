@@ -0,0 +1,576 @@
+#!-*- coding:utf-8 -*-
+# python3.7
+# CreateTime: 2026/10/18 19:30
+# FileName: 异步数据库（asyncio）
+
+"""
+与mysqlDB、redisDB、mongoDB、esDB相同的使用方式与返回格式 {'result': 结果, 'success': 是否成功}，
+全部为协程，同一个事件循环中可并发大量查询：
+
+    res = await aioDB.mysql_execute('SELECT * FROM `user` WHERE `id` = %s', [1])
+    res = await aioDB.redis_execute('get', 'key', db_name=14)
+    res = await aioDB.mongo_execute('user', 'find', {'name': 'test'}, db_name='log')
+    res = await aioDB.es_execute('demo', 'search', body={'query': {'match_all': {}}})
+
+连接池按事件循环创建（异步连接不能跨事件循环使用），参数与poolDB相同（db_conf['pool']）。
+事件循环结束前调用 await close_pool() 关闭
+"""
+
+import asyncio
+import inspect
+import logging
+import time
+from typing import Union
+
+import aiomysql
+import elasticsearch
+from pymysql.constants import CLIENT
+import redis.asyncio as aioredis
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from dao import db, config, db_exception, poolDB, mysqlDB, redisDB, mongoDB, esDB
+from dao.db_exception import PoolTimeout
+from dao.pool_metrics import PoolMetrics
+
+_pools = {}  # (事件循环, mode, db_name, 冻结的db_conf): 创建连接池的Task，事件循环关闭后移除
+
+
+class _AsyncPool:
+    """单个事件循环中的连接池"""
+
+    def __init__(self, mode: str, db_name, db_conf: dict):
+        self.mode = mode
+        self.db_name = db_name
+        self.options = poolDB.pool_options(mode, db_conf)
+        name = f'{db_conf.get("host")}:{db_conf.get("port")}/{db_name}' if db_conf else ''
+        self.metrics = PoolMetrics(f'async-{mode}', name, gauges=self.gauges)
+        self.pool = None  # mysql: aiomysql.Pool；redis: ConnectionPool
+        self.client = None  # redis、mongo、elasticsearch的客户端（自带连接池）
+
+    async def open(self, db_conf: dict):
+        options = self.options
+        if self.mode == 'mysql':
+            self.pool = await aiomysql.create_pool(
+                minsize=options['min_idle'],
+                maxsize=options['max_connections'],
+                pool_recycle=options['max_lifetime'] or -1,
+                host=db_conf['host'],
+                port=db_conf['port'],
+                user=db_conf['user'],
+                password=db_conf['password'],
+                db=self.db_name,
+                connect_timeout=poolDB.MYSQL_CONNECT_TIMEOUT,
+                charset='utf8mb4',
+                autocommit=True,
+                cursorclass=aiomysql.DictCursor,
+                local_infile=bool(db_conf.get('local_infile')),
+                client_flag=CLIENT.MULTI_STATEMENTS if db_conf.get('multi_statements') else 0,
+            )
+        elif self.mode == 'redis':
+            kwargs = {
+                'host': db_conf['host'],
+                'port': db_conf['port'],
+                'password': db_conf['password'],
+                'db': self.db_name,
+                'decode_responses': True,
+                'max_connections': options['max_connections'],
+                'health_check_interval': options['health_check_interval'],
+            }
+            if options['acquire_timeout'] is None:
+                self.pool = aioredis.ConnectionPool(**kwargs)
+            else:
+                self.pool = aioredis.BlockingConnectionPool(timeout=options['acquire_timeout'], **kwargs)
+            self.client = aioredis.Redis(connection_pool=self.pool)
+        elif self.mode == 'mongo':
+            kwargs = {
+                'maxPoolSize': options['max_connections'],
+                'minPoolSize': options['min_idle'],
+                'event_listeners': [poolDB._MongoPoolListener(self.metrics)],
+            }
+            if options['max_idle_time']:
+                kwargs['maxIdleTimeMS'] = int(options['max_idle_time'] * 1000)
+            if options['acquire_timeout']:
+                kwargs['waitQueueTimeoutMS'] = int(options['acquire_timeout'] * 1000)
+            self.client = AsyncIOMotorClient(**db.mongo_options(db_conf), **kwargs)
+        elif self.mode == 'elasticsearch':
+            self.client = elasticsearch.AsyncElasticsearch(**db.es_options(db_conf))
+        else:
+            raise Exception(f'mode错误，当前未实现{self.mode}模式')
+        return self
+
+    async def acquire(self):
+        """mysql：获取连接，超时扔出PoolTimeout"""
+        start = time.time()
+        try:
+            conn = await asyncio.wait_for(self.pool.acquire(), self.options['acquire_timeout'])
+        except asyncio.TimeoutError:
+            self.metrics.incr('acquire_timeouts')
+            raise PoolTimeout(f'获取连接超时（{self.options["acquire_timeout"]}s）')
+        except Exception:
+            self.metrics.incr('acquire_errors')
+            raise
+        if self.options['ping']:  # aiomysql没有按时机检查的参数，每次取出时检查，断开则重连
+            try:
+                await conn.ping(reconnect=True)
+            except Exception:
+                self.metrics.incr('acquire_errors')
+                conn.close()
+                self.pool.release(conn)
+                raise
+        self.metrics.observe_wait(time.time() - start)
+        return conn
+
+    def release(self, conn):
+        self.pool.release(conn)
+
+    def gauges(self) -> dict:
+        if self.mode == 'mysql' and self.pool is not None:
+            return {
+                'checked_out': self.pool.size - self.pool.freesize,
+                'idle': self.pool.freesize,
+                'max_connections': self.pool.maxsize,
+            }
+        if self.mode == 'redis' and isinstance(self.pool, aioredis.BlockingConnectionPool):
+            idle = sum(1 for conn in self.pool.pool._queue if conn is not None)
+            return {
+                'checked_out': len(self.pool._connections) - idle,
+                'idle': idle,
+                'max_connections': self.pool.max_connections,
+            }
+        if self.mode == 'redis' and self.pool is not None:
+            return {
+                'checked_out': len(self.pool._in_use_connections),
+                'idle': len(self.pool._available_connections),
+                'max_connections': self.pool.max_connections,
+            }
+        return {}
+
+    async def close(self):
+        try:
+            if self.mode == 'mysql':
+                self.pool.close()
+                await self.pool.wait_closed()
+            elif self.mode == 'redis':
+                await self.pool.disconnect()
+            elif self.mode == 'mongo':
+                self.client.close()
+            elif self.mode == 'elasticsearch':
+                await self.client.close()
+        except Exception as e:
+            logging.error(f'异步连接池 {self.mode} {self.metrics.name} 关闭失败: {e}')
+
+
+async def get_pool(mode: str, db_name, db_conf: dict) -> _AsyncPool:
+    """
+    当前事件循环的连接池，不存在时创建（并发首次使用时只创建一个）
+    :param mode: mysql、redis、mongo、elasticsearch
+    :param db_name:
+    :param db_conf:
+    :return:
+    """
+    loop = asyncio.get_event_loop()
+    key = (loop, mode, db_name, poolDB._freeze(db_conf))
+    task = _pools.get(key)
+    if task is None:
+        _prune_closed_loops()
+        task = _pools[key] = loop.create_task(_AsyncPool(mode, db_name, db_conf).open(db_conf))
+    try:
+        return await asyncio.shield(task)  # 调用方被取消时不影响创建
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        if _pools.get(key) is task:  # 创建失败，下次重新创建
+            del _pools[key]
+        raise
+
+
+def _prune_closed_loops():
+    """
+    移除已关闭的事件循环的连接池（未调用close_pool()就结束的事件循环，如多次asyncio.run()），
+    其连接已不能使用，移除后随事件循环一起释放
+    """
+    for key in [key for key in _pools if key[0].is_closed()]:
+        del _pools[key]
+
+
+def pool_stats() -> dict:
+    """
+    当前事件循环的连接池指标
+    :return: {'mode/host:port/db': 指标}
+    """
+    loop = asyncio.get_event_loop()
+    return {
+        f'{key[1]}/{task.result().metrics.name}': task.result().metrics.snapshot()
+        for key, task in list(_pools.items())
+        if key[0] is loop and task.done() and not task.cancelled() and task.exception() is None
+    }
+
+
+async def close_pool():
+    """关闭当前事件循环的所有连接池"""
+    loop = asyncio.get_event_loop()
+    for key in [key for key in _pools if key[0] is loop]:
+        task = _pools.pop(key)
+        try:
+            pool = await task
+        except Exception:
+            continue
+        await pool.close()
+
+
+class AsyncMysql:
+    default_conf = mysqlDB.Mysql.default_conf
+
+    def __init__(self, db_name, db_conf) -> None:
+        self.__db_name = db_name
+        self.__db_conf = db_conf
+
+    async def execute(
+            self,
+            sql,
+            args: list,
+            *,
+            to_json: bool = True,
+            raise_error: bool = True,
+            log_key: str = '',
+    ):
+        """
+
+        :param sql:
+        :param args:
+        :param to_json: 是否进行json转换
+        :param raise_error: 是否扔出异常
+        :param log_key:
+        :return:
+        """
+        res = await self.__execute([{'sql': sql, 'args': args}], to_json=to_json, raise_error=raise_error, log_key=log_key)
+        if res['success']:
+            res['result'] = res['result'][0]
+        return res
+
+    async def execute_many(
+            self,
+            sql_with_args_list: list,
+            *,
+            to_json: bool = True,
+            raise_error: bool = True,
+            log_key: str = '',
+    ):
+        """
+        一个事务中的多条sql语句
+        :param sql_with_args_list: [{'sql': sql, 'args': args}, ...]
+        :param to_json: 是否进行json转换
+        :param raise_error: 是否扔出异常
+        :param log_key:
+        :return:
+        """
+        return await self.__execute(sql_with_args_list, to_json=to_json, raise_error=raise_error, log_key=log_key)
+
+    @staticmethod
+    async def __execute_one(cursor, sql: str, args: list, is_select: bool):
+        if is_select:
+            await cursor.execute(sql, args)
+            return await cursor.fetchall()
+        if args and isinstance(args[0], (list, tuple)):
+            return await cursor.executemany(sql, args)
+        return await cursor.execute(sql, args)
+
+    async def __execute(self, sql_with_args_list: list, *, to_json: bool, raise_error: bool, log_key: str):
+        # aiomysql没有读写超时参数，每条语句的耗时不超过同步连接池的读写超时之和
+        timeout = poolDB.MYSQL_READ_TIMEOUT + poolDB.MYSQL_WRITE_TIMEOUT
+        res = {'result': None, 'success': True}
+        pool = await get_pool('mysql', self.__db_name, self.__db_conf)
+        conn = await pool.acquire()
+        start = time.time()
+        try:
+            await conn.begin()
+            result = []
+            async with conn.cursor() as cursor:
+                for sql_with_args in sql_with_args_list:
+                    sql, is_select = mysqlDB.statement(sql_with_args['sql'])
+                    args = sql_with_args.get('args') or []
+                    mysqlDB.logging_sql(sql, args, key=log_key)
+                    result_ = await asyncio.wait_for(self.__execute_one(cursor, sql, args, is_select), timeout)
+                    if is_select and to_json:
+                        result_ = mysqlDB.convert_rows(result_, cursor)
+                    result.append(result_)
+            await conn.commit()
+            res['result'] = result
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                conn.close()  # 超时中断的连接状态未知，不再使用（release时丢弃）
+            else:
+                await conn.rollback()
+            res['success'] = False
+            res['result'] = str(e)
+            if raise_error:
+                raise db_exception.DbException(e)
+        finally:
+            pool.metrics.observe_query(time.time() - start, success=res['success'])
+            pool.release(conn)
+
+        return res
+
+
+class AsyncRedis:
+    default_conf = redisDB.Redis.default_conf
+    default_db = redisDB.Redis.default_db
+
+    def __init__(self, db_name, db_conf) -> None:
+        self.__db_name = db_name
+        self.__db_conf = db_conf
+
+    async def execute(self, action, *args, **kwargs) -> dict:
+        raise_error = kwargs.pop('raise_error') if 'raise_error' in kwargs else True  # 是否扔出异常
+
+        res = {'result': None, 'success': True}
+        pool = await get_pool('redis', self.__db_name, self.__db_conf)
+        start = time.time()
+        try:
+            res['result'] = await getattr(pool.client, action)(*args, **kwargs)
+        except Exception as e:
+            res['result'] = str(e)
+            res['success'] = False
+            if raise_error:
+                raise db_exception.DbException(e)
+        finally:
+            pool.metrics.observe_query(time.time() - start, success=res['success'])
+
+        return res
+
+
+class AsyncMongo:
+    default_conf = mongoDB.Mongo.default_conf
+
+    def __init__(self, db_name, db_conf) -> None:
+        self.__db_name = db_name
+        self.__db_conf = db_conf
+
+    async def execute(self, collection_name: str, action: str, *args, **kwargs):
+        """
+
+        :param action: 执行的命令
+        :param collection_name: 指定的集合
+        :param args:
+        :param kwargs:
+        :return:
+        """
+        raise_error = kwargs.pop('raise_error') if 'raise_error' in kwargs else True  # 是否扔出异常
+
+        res = {'result': None, 'success': True}
+        pool = await get_pool('mongo', self.__db_name, self.__db_conf)
+        start = time.time()
+        try:
+            result = getattr(pool.client[self.__db_name][collection_name], action)(*args, **kwargs)
+            if hasattr(result, 'to_list'):  # find、aggregate等返回游标，取出全部结果
+                result = await result.to_list(length=None)
+            elif inspect.isawaitable(result):
+                result = await result
+            res['result'] = result
+        except Exception as e:
+            res['result'] = str(e)
+            res['success'] = False
+            if raise_error:
+                raise db_exception.DbException(e)
+        finally:
+            pool.metrics.observe_query(time.time() - start, success=res['success'])
+
+        return res
+
+
+class AsyncElasticsearch:
+    default_conf = esDB.Elasticsearch.default_conf
+
+    def __init__(self, db_conf) -> None:
+        self.__db_conf = db_conf
+
+    async def execute(self, index_name: str, action: str, *args, **kwargs):
+        """
+
+        :param index_name: 指定的索引
+        :param action: 执行的命令
+        :param args:
+        :param kwargs:
+        :return:
+        """
+        raise_error = kwargs.pop('raise_error') if 'raise_error' in kwargs else True  # 是否扔出异常
+
+        res = {'result': None, 'success': True}
+        pool = await get_pool('elasticsearch', None, self.__db_conf)
+        start = time.time()
+        try:
+            res['result'] = await getattr(pool.client, action)(index=index_name, *args, **kwargs)
+        except Exception as e:
+            res['result'] = str(e)
+            res['success'] = False
+            if raise_error:
+                raise db_exception.DbException(e)
+        finally:
+            pool.metrics.observe_query(time.time() - start, success=res['success'])
+
+        return res
+
+
+def mysql_obj(db_name: str = None, *, db_conf: dict = None) -> AsyncMysql:
+    """
+
+    :param db_name: 库名
+    :param db_conf: 数据库配置。格式参考 mysqlDB.Mysql.default_conf
+    :return:
+    """
+    if db_name is None:
+        db_name = config.MYSQL_DB
+
+    db_config = dict(AsyncMysql.default_conf)
+    if db_conf is not None:
+        db_config.update(db_conf)
+
+    return AsyncMysql(db_name, db_config)
+
+
+def redis_obj(db_name: Union[int, str] = AsyncRedis.default_db, *, db_conf: dict = None) -> AsyncRedis:
+    """
+
+    :param db_name: 库名。int 或 config中已有的命名定义
+    :param db_conf: 数据库配置。格式参考 redisDB.Redis.default_conf
+    :return:
+    """
+    db_name = config.REDIS_DB.get(db_name, db_name)
+
+    db_config = dict(AsyncRedis.default_conf)
+    if db_conf is not None:
+        db_config.update(db_conf)
+
+    return AsyncRedis(db_name, db_config)
+
+
+def mongo_obj(db_name: str = None, *, db_conf: dict = None) -> AsyncMongo:
+    """
+
+    :param db_name: 库名
+    :param db_conf: 数据库配置。格式参考 mongoDB.Mongo.default_conf
+    :return:
+    """
+    if db_name is None:
+        db_name = config.MONGO_DB
+
+    db_config = dict(AsyncMongo.default_conf)
+    if db_conf is not None:
+        db_config.update(db_conf)
+
+    return AsyncMongo(db_name, db_config)
+
+
+def es_obj(db_conf: dict = None) -> AsyncElasticsearch:
+    db_config = dict(AsyncElasticsearch.default_conf)
+    if db_conf is not None:
+        db_config.update(db_conf)
+
+    return AsyncElasticsearch(db_config)
+
+
+async def mysql_execute(sql: str, args: list = None, db_name: str = None, db_conf: dict = None, **kwargs):
+    """
+    单条sql语句
+    :param sql: SELECT * FROM `user` WHERE `id` = %s AND `name` = %s
+    :param args: [1, 'test']
+    :param db_name: 库名
+    :param db_conf: 数据库配置。格式参考 mysqlDB.Mysql.default_conf
+    :return:
+    """
+    return await mysql_obj(db_name, db_conf=db_conf).execute(sql, args or [], **kwargs)
+
+
+async def mysql_execute_many(sql_with_args_list, db_name: str = None, db_conf: dict = None, **kwargs):
+    """
+    一个事务中的多条sql语句
+    :param sql_with_args_list: [{'sql': sql, 'args': args}, ...]
+    :param db_name: 库名
+    :param db_conf: 数据库配置。格式参考 mysqlDB.Mysql.default_conf
+    :return:
+    """
+    return await mysql_obj(db_name, db_conf=db_conf).execute_many(sql_with_args_list, **kwargs)
+
+
+async def redis_execute(
+        action: str, *args,
+        db_name: Union[int, str] = AsyncRedis.default_db, db_conf: dict = None, **kwargs,
+):
+    """
+
+    :param action: 执行动作（方法str）
+    :param args:
+    :param db_name: 库名。int 或 config中已有的命名定义
+    :param db_conf: 数据库配置。格式参考 redisDB.Redis.default_conf
+    :param kwargs:
+    :return:
+    """
+    return await redis_obj(db_name, db_conf=db_conf).execute(action, *args, **kwargs)
+
+
+async def mongo_execute(
+        collection_name: str, action: str, *args,
+        db_name: str = None, db_conf: dict = None, **kwargs,
+):
+    """
+
+    :param collection_name: 集合名
+    :param action: 执行动作（方法str）
+    :param args:
+    :param db_name: 库名
+    :param db_conf: 数据库配置。格式参考 mongoDB.Mongo.default_conf
+    :param kwargs:
+    :return:
+    """
+    return await mongo_obj(db_name, db_conf=db_conf).execute(collection_name, action, *args, **kwargs)
+
+
+async def es_execute(index_name: str, action: str, *args, db_conf: dict = None, **kwargs):
+    """
+
+    :param index_name: 索引名
+    :param action: 执行动作（方法str）
+    :param args:
+    :param db_conf: 数据库配置。格式参考 esDB.Elasticsearch.default_conf
+    :param kwargs:
+    :return:
+    """
+    return await es_obj(db_conf).execute(index_name, action, *args, **kwargs)
+
+
+if __name__ == '__main__':
+    # 并发查询的QPS，线程池执行同步接口与事件循环执行异步接口对比（需可用的MySQL，配置见config）：python -m dao.aioDB
+    from concurrent.futures import ThreadPoolExecutor
+
+    times = 2000
+
+    def bench_thread(threads: int = 16):
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(lambda _: mysqlDB.execute('SELECT SLEEP(0.01)'), range(times)))
+        return times / (time.time() - start)
+
+    async def bench_async(concurrency: int = 200):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                await mysql_execute('SELECT SLEEP(0.01)')
+
+        start = time.time()
+        await asyncio.gather(*[one() for _ in range(times)])
+        qps = times / (time.time() - start)
+        await close_pool()
+        return qps
+
+    def check_closed_loops(runs: int = 5):
+        """多次asyncio.run()且未关闭连接池时，只保留当前事件循环的记录（redis连接池创建时不连接）"""
+        conf = {'host': '127.0.0.1', 'port': 6379, 'password': None}
+        for _ in range(runs):
+            asyncio.run(get_pool('redis', 0, conf))
+        assert len(_pools) == 1, len(_pools)
+        print(f'closed loops pruned: {runs} runs -> {len(_pools)} pool')
+
+    check_closed_loops()
+    print(f'thread pool (16)    {bench_thread():>10.0f} qps')
+    print(f'asyncio (200 tasks) {asyncio.get_event_loop().run_until_complete(bench_async()):>10.0f} qps')
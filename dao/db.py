@@ -4,6 +4,7 @@
 # FileName: 单连接
 
 import pymysql
+from pymysql.constants import CLIENT
 import redis
 from elasticsearch import Elasticsearch
 from pymongo import MongoClient
@@ -64,7 +65,9 @@ def mysql_conn(db_name, db_conf):
         connect_timeout=15,
         charset='utf8',
         autocommit=True,
-        cursorclass=pymysql.cursors.DictCursor
+        cursorclass=pymysql.cursors.DictCursor,
+        local_infile=bool(db_conf.get('local_infile')),
+        client_flag=CLIENT.MULTI_STATEMENTS if db_conf.get('multi_statements') else 0,
     )
     return conn
 
@@ -80,7 +83,7 @@ def redis_conn(db_name, db_conf):
     return conn
 
 
-def mongo_coon(db_conf):
+def mongo_options(db_conf) -> dict:
     if db_conf['user']:
         options = {
             'host': db_conf['host'],
@@ -94,8 +97,19 @@ def mongo_coon(db_conf):
             'host': db_conf['host'],
             'port': db_conf['port'],
         }
+    return options
+
+
+def mongo_coon(db_conf, **kwargs):
+    """
+
+    :param db_conf:
+    :param kwargs: MongoClient的其他参数（连接池大小等）
+    :return:
+    """
     client = MongoClient(
-        **options
+        **mongo_options(db_conf),
+        **kwargs,
     )
     return client
 
@@ -110,10 +124,14 @@ def es_coon(db_conf):
     # )
 
     # Elasticsearch==7.15.2
-    client = Elasticsearch(
-        hosts=f'http://{db_conf["host"]}:{db_conf["port"]}',
-        http_auth=(db_conf['user'], db_conf['password']),
-        sniff_on_node_failure=True,
-        sniff_timeout=60,
-    )
+    client = Elasticsearch(**es_options(db_conf))
     return client
+
+
+def es_options(db_conf) -> dict:
+    return {
+        'hosts': f'http://{db_conf["host"]}:{db_conf["port"]}',
+        'http_auth': (db_conf['user'], db_conf['password']),
+        'sniff_on_node_failure': True,
+        'sniff_timeout': 60,
+    }
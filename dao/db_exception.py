@@ -10,3 +10,7 @@ class DbException(Exception):
 
     def __str__(self):
         return self.message
+
+
+class PoolTimeout(DbException):
+    """获取连接池连接超时"""
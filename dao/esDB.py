@@ -50,7 +50,7 @@ class Elasticsearch:
 
 
 def es_obj(db_conf: dict = None, *, use_pool: bool = True):
-    db_config = Elasticsearch.default_conf
+    db_config = dict(Elasticsearch.default_conf)
     if db_conf is not None:
         db_config.update(db_conf)
 
@@ -3,6 +3,8 @@
 # CreateTime: 2022/11/28 18:52
 # FileName:
 
+import time
+
 from dao import poolDB, db, config, db_exception
 
 
@@ -15,9 +17,11 @@ class Mongo:
     }
 
     def __init__(self, db_name, db_conf, *, use_pool) -> None:
+        self.__metrics = None
         if use_pool:
-            self.__conn = poolDB.get_coon(mode='mongo', db_name=db_name, db_conf=db_conf)
-            pass
+            pool = poolDB.get_pool(mode='mongo', db_name=db_name, db_conf=db_conf)
+            self.__conn = pool.get_connection()
+            self.__metrics = pool.metrics
         else:
             self.__conn = db.Db('mongo', db_name, db_conf)
 
@@ -37,6 +41,7 @@ class Mongo:
         raise_error = kwargs.pop('raise_error') if 'raise_error' in kwargs else True  # 是否扔出异常
 
         res = {'result': None, 'success': True}
+        start = time.time()
         with self.__conn as coon:
             try:
                 cursor = coon[collection_name]
@@ -49,11 +54,14 @@ class Mongo:
                 res['success'] = False
                 if raise_error:
                     raise db_exception.DbException(e)
+            finally:
+                if self.__metrics is not None:
+                    self.__metrics.observe_query(time.time() - start, success=res['success'])
 
         return res
 
 
-def mongo_obj(db_name: int = None, *, db_conf: dict = None, use_pool: bool = False):
+def mongo_obj(db_name: int = None, *, db_conf: dict = None, use_pool: bool = True):
     """
 
     :param db_name: 库名
@@ -64,7 +72,7 @@ def mongo_obj(db_name: int = None, *, db_conf: dict = None, use_pool: bool = Fal
     if db_name is None:
         db_name = config.MONGO_DB
 
-    db_config = Mongo.default_conf
+    db_config = dict(Mongo.default_conf)
     if db_conf is not None:
         db_config.update(db_conf)
 
@@ -83,16 +91,25 @@ def execute(
     :param args:
     :param db_name: 库名
     :param db_conf: 数据库配置。格式参考 Mongo.default_conf
-    :param use_pool:
+    :param use_pool: 是否使用连接池（进程内共享MongoClient）
     :param kwargs:
     :return:
     """
-    use_pool = False  # 强制使用Db实现
     mongo = mongo_obj(db_name, db_conf=db_conf, use_pool=use_pool)
     return mongo.execute(collection_name, action, *args, **kwargs)
 
 
 if __name__ == '__main__':
+    # 单次操作耗时，连接池与每次新建连接对比（需可用的MongoDB，配置见config）：python -m dao.mongoDB
+    def bench(use_pool: bool, times: int = 200):
+        start = time.time()
+        for _ in range(times):
+            execute('bench', 'find_one', {}, use_pool=use_pool)
+        return (time.time() - start) / times * 1000
+
+    print(f'use_pool=False: {bench(False):.2f} ms/op')
+    print(f'use_pool=True : {bench(True):.2f} ms/op')
+
     # result = execute('user', 'find', '', db_name='log')
     # result = execute('user', 'insert_many', [{'name': 'test_01'}], db_name='log').acknowledged
     # print(result)
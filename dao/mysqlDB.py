@@ -3,11 +3,38 @@
 # CreateTime: 2022/11/22 14:14
 # FileName:
 
+import datetime
+import functools
+import itertools
 import json
 import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from typing import Iterable
 
-from dao import poolDB, db, config, db_exception
-from utils import DataEncoder
+import pymysql
+from pymysql.constants import FIELD_TYPE
+
+from dao import poolDB, db, config, db_exception, sql_builder, slow_query
+from utils import DataEncoder, context
+
+STATEMENT_CACHE_SIZE = 1024  # 缓存的sql语句数量
+STREAM_BATCH_SIZE = 1000  # 流式查询每次从服务端读取的行数
+SCAN_BATCH_SIZE = 1000  # 按主键分页遍历时每页的行数
+BULK_CHUNK_SIZE = 1000  # 批量插入每批的最大行数
+BULK_MAX_BYTES = 1024 * 1024  # 批量插入每批的最大字节数（含语句），需明显小于服务端的max_allowed_packet（5.7默认4M）
+
+RESULT_KINDS = ('rows', 'one', 'rowcount', 'lastrowid')  # execute_many每条语句的结果类型
+
+ROUTE_ROUND_ROBIN = 'round_robin'
+ROUTE_LEAST_LATENCY = 'least_latency'
+ROUTE_KEYS = ('replicas', 'route', 'read_your_writes')  # db_conf中读写分离的配置项
 
 
 class Mysql:
@@ -18,9 +45,14 @@ class Mysql:
         'password': config.MYSQL_PWD,
     }
 
-    def __init__(self, db_name, db_conf, *, use_pool) -> None:
+    def __init__(self, db_name, db_conf, *, use_pool, router=None) -> None:
+        self.__metrics = None
+        self.__db_name = db_name
+        self.__router = router
         if use_pool:
-            self.__conn = poolDB.get_coon(mode='mysql', db_name=db_name, db_conf=db_conf)
+            pool = poolDB.get_pool(mode='mysql', db_name=db_name, db_conf=db_conf)
+            self.__conn = pool.get_connection()
+            self.__metrics = pool.metrics
         else:
             self.__conn = db.Db('mysql', db_name, db_conf)
 
@@ -28,6 +60,10 @@ class Mysql:
     def coon(self):
         return self.__conn
 
+    def __mark_write(self):
+        if self.__router is not None:
+            self.__router.mark_write(self.__db_name)
+
     def execute(
             self,
             sql,
@@ -36,6 +72,8 @@ class Mysql:
             to_json: bool = True,
             raise_error: bool = True,
             log_key: str = '',
+            stream: bool = False,
+            batch_size: int = None,
     ):
         """
 
@@ -44,27 +82,39 @@ class Mysql:
         :param to_json: 是否进行json转换
         :param raise_error: 是否扔出异常
         :param log_key:
+        :param stream: 是否流式查询，result为生成器，见 execute_iter
+        :param batch_size: 流式查询时，每次返回的行数
         :return:
         """
+        if stream:
+            return {
+                'result': self.execute_iter(sql, args, to_json=to_json, batch_size=batch_size, log_key=log_key),
+                'success': True,
+            }
+
         res = {'result': None, 'success': True}
+        start = time.time()
         with self.__conn as conn:
             try:
                 conn.begin()
                 cursor = conn.cursor()
-                sql = sql.replace('\'%s\'', '%s').strip()
+                sql, is_select = statement(sql)
                 logging_sql(sql, args, key=log_key)
-                if sql.startswith('SELECT') or sql.startswith('select'):
+                query_start = time.time()
+                if is_select:
                     cursor.execute(sql, args)
                     result = cursor.fetchall()
-                    if to_json:
-                        result = json.loads(json.dumps(result, cls=DataEncoder.MySQLEncoder))
                 else:
+                    self.__mark_write()
                     if not args:
                         result = cursor.execute(sql, args)
                     elif isinstance(args[0], (list, tuple)):
                         result = cursor.executemany(sql, args)
                     else:
                         result = cursor.execute(sql, args)
+                query_cost = time.time() - query_start
+                if is_select and to_json:
+                    result = convert_rows(result, cursor)
                 conn.commit()
                 res['result'] = result
             except Exception as e:
@@ -73,50 +123,362 @@ class Mysql:
                 res['result'] = str(e)
                 if raise_error:
                     raise db_exception.DbException(e)
+            finally:
+                if self.__metrics is not None:
+                    self.__metrics.observe_query(time.time() - start, success=res['success'])
+
+            slow_log = slow_query.current()
+            if slow_log is not None and res['success']:
+                # 开启慢查询记录时，超过阈值的语句在同一连接中EXPLAIN（使用新的游标，不影响结果），失败只记录日志
+                try:
+                    with conn.cursor() as slow_cursor:
+                        slow_log.observe(sql, args, query_cost, cursor=slow_cursor)
+                except Exception as e:
+                    logging.warning(f'慢查询记录失败: {e}')
 
         return res
 
-    def execute_many(
+    def execute_iter(
             self,
-            sql_with_args_list: list,
+            sql,
+            args: list,
             *,
             to_json: bool = True,
+            batch_size: int = None,
+            log_key: str = '',
+    ):
+        """
+        流式查询（服务端游标SSDictCursor），逐行从服务端读取，内存占用与结果行数无关。
+        查询失败时扔出异常；结果需读取完（或关闭生成器）后连接才会释放。
+        未读取完就中止（break、关闭生成器、异常）时直接关闭该连接，服务端不再发送剩余的行，
+        代价是连接池中的该连接下次使用时需要重新连接
+        :param sql:
+        :param args:
+        :param to_json: 是否进行json转换（逐行转换）
+        :param batch_size: 每次返回的行数，为空则逐行返回
+        :param log_key:
+        :return: 生成器，每次返回一行，或batch_size行组成的列表
+        """
+        start = time.time()
+        success = True
+        unread = False  # 服务端是否还有未读取的行
+        with self.__conn as conn:
+            cursor = conn.cursor(pymysql.cursors.SSDictCursor)
+            try:
+                sql, _ = statement(sql)
+                logging_sql(sql, args, key=log_key)
+                cursor.execute(sql, args)
+                unread = True
+                converters = row_converters(cursor) if to_json else None
+                while True:
+                    rows = cursor.fetchmany(batch_size or STREAM_BATCH_SIZE)
+                    if not rows:
+                        unread = False
+                        break
+                    if to_json:
+                        rows = convert_rows(rows, converters=converters)
+                    if batch_size:
+                        yield rows
+                    else:
+                        yield from rows
+            except GeneratorExit:
+                raise
+            except Exception as e:
+                success = False
+                raise db_exception.DbException(e)
+            finally:
+                if unread:
+                    _abort_stream(conn)  # 不读取剩余的行（可能很多），直接关闭连接
+                else:
+                    try:
+                        cursor.close()
+                    except Exception:
+                        success = False
+                if self.__metrics is not None:
+                    self.__metrics.observe_query(time.time() - start, success=success)
+
+    def bulk_insert(
+            self,
+            table_name: str,
+            rows: Iterable[dict],
+            *,
+            chunk_size: int = BULK_CHUNK_SIZE,
+            max_bytes: int = BULK_MAX_BYTES,
+            upsert_cols: list = None,
+            load_data: bool = False,
             raise_error: bool = True,
             log_key: str = '',
     ):
         """
+        批量插入：按行数与字节数分批，每批一条多行INSERT（或LOAD DATA LOCAL INFILE），每批单独提交。
+        失败时已提交的批次不会回滚
+        :param table_name: 表名
+        :param rows: 多行数据（可为生成器），字段以第一行为准
+        :param chunk_size: 每批的最大行数
+        :param max_bytes: 每批的最大字节数（utf8编码后，含语句本身）
+        :param upsert_cols: 主键相同时，需要更新的字段（INSERT ... ON DUPLICATE KEY UPDATE）
+        :param load_data: 是否使用LOAD DATA LOCAL INFILE（需db_conf['local_infile']为True，服务端开启local_infile）
+        :param raise_error: 是否扔出异常
+        :param log_key:
+        :return: result: {'rows': 插入的行数, 'chunks': 批次数, 'seconds': 耗时, 'rows_per_second': 每秒行数}
+        """
+        if load_data and upsert_cols:
+            raise Exception('LOAD DATA 不支持 upsert_cols')
+
+        rows = iter(rows)
+        first = next(rows, None)
+        summary = {'rows': 0, 'chunks': 0, 'seconds': 0, 'rows_per_second': 0}
+        res = {'result': summary, 'success': True}
+        if first is None:
+            return res
+
+        cols = list(first)
+        rows = itertools.chain([first], rows)
+        start = chunk_start = time.time()
+        self.__mark_write()
+        with self.__conn as conn:
+            cursor = conn.cursor()
+            try:
+                if load_data:
+                    columns = ','.join(f'`{col}`' for col in cols)
+                    sql = (
+                        f"LOAD DATA LOCAL INFILE %s INTO TABLE `{table_name}` CHARACTER SET utf8mb4 "
+                        f"FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '\\\\' "
+                        f"LINES TERMINATED BY '\\n' ({columns})"
+                    )
+                    encode = lambda row: ','.join(_csv_value(row[col]) for col in cols) + '\n'
+                    separator = ''
+                    reserved = len(sql.encode('utf8'))
+                else:
+                    prefix, placeholder, suffix = sql_builder.gen_bulk_insert_parts(table_name, cols, upsert_cols)
+                    encode = lambda row: cursor.mogrify(placeholder, [row[col] for col in cols])
+                    separator = ','
+                    reserved = len((prefix + suffix).encode('utf8'))
+                logging.info(f'sql: 批量插入 {table_name}，{"LOAD DATA" if load_data else "INSERT"} {cols}')
+
+                for chunk in _chunks(rows, encode, chunk_size, max_bytes, reserved=reserved):
+                    chunk_start = time.time()
+                    if load_data:
+                        _load_data(cursor, sql, ''.join(chunk))
+                    else:
+                        cursor.execute(prefix + separator.join(chunk) + suffix)
+                    conn.commit()
+                    summary['rows'] += len(chunk)
+                    summary['chunks'] += 1
+                    if self.__metrics is not None:
+                        self.__metrics.observe_query(time.time() - chunk_start)
+            except Exception as e:
+                conn.rollback()
+                res['success'] = False
+                if self.__metrics is not None:
+                    self.__metrics.observe_query(time.time() - chunk_start, success=False)
+                if raise_error:
+                    raise db_exception.DbException(e)
+            finally:
+                cost = time.time() - start
+                summary['seconds'] = round(cost, 3)
+                summary['rows_per_second'] = round(summary['rows'] / cost) if cost else 0
+                logging.info(
+                    f'批量插入 {table_name}{f" [{log_key}]" if log_key else ""}: {summary["rows"]}行，'
+                    f'{summary["chunks"]}批，{summary["seconds"]}s，{summary["rows_per_second"]}行/s'
+                )
+
+        return res
 
-        :param sql_with_args_list:
+    def select(
+            self,
+            table_name: str,
+            cols: list,
+            condition: dict = None,
+            *,
+            in_chunk_size: int = sql_builder.IN_CHUNK_SIZE,
+            in_table_size: int = sql_builder.IN_TABLE_SIZE,
+            to_json: bool = True,
+            raise_error: bool = True,
+            log_key: str = '',
+            **kwargs,
+    ):
+        """
+        查询，条件中IN的值很多时，避免一条语句中有大量占位符（语句过大、超出max_allowed_packet）：
+            不超过in_chunk_size：一条语句
+            IN不超过in_table_size，且没有统计、分组、排序、分页：按in_chunk_size分为多条语句，结果依次合并
+            其他：值写入临时表，条件改为 IN (SELECT `v` FROM 临时表)，同一连接中一条语句查询
+        :param table_name: 表名
+        :param cols: 查询的字段
+        :param condition: 查询条件，见sql_builder.gen_wheres()用法
+        :param in_chunk_size: 每条语句IN的最大值数量
+        :param in_table_size: IN的值超过该数量时使用临时表
         :param to_json: 是否进行json转换
         :param raise_error: 是否扔出异常
         :param log_key:
+        :param kwargs: sum_item、count_item、group_by、order_by、limit、offset，见sql_builder.gen_select_sql()
         :return:
         """
+        found = sql_builder.large_in(condition, in_chunk_size)
+        if found is None:
+            sql, args = sql_builder.gen_select_sql(table_name, cols, condition, **kwargs)
+            return self.execute(sql, args, to_json=to_json, raise_error=raise_error, log_key=log_key)
+
+        field, op, values = found
+        mergeable = op.upper() == 'IN' and not any(
+            kwargs.get(key) for key in ('sum_item', 'count_item', 'group_by', 'order_by', 'limit', 'offset')
+        )
+        if mergeable and len(values) <= in_table_size:
+            return self.__select_chunks(
+                table_name, cols, sql_builder.split_in(condition, field, op, in_chunk_size),
+                to_json=to_json, raise_error=raise_error, log_key=log_key, **kwargs,
+            )
 
+        return self.__select_in_table(
+            table_name, cols, condition, field, op, values,
+            to_json=to_json, raise_error=raise_error, log_key=log_key, **kwargs,
+        )
+
+    def __select_chunks(self, table_name, cols, conditions, *, to_json, raise_error, log_key, **kwargs):
+        """
+        多个条件依次查询，结果合并。
+        连接池的连接退出with时即归还，所有语句需在同一个with中执行
+        """
+        res = {'result': [], 'success': True}
+        start = time.time()
+        with self.__conn as conn:
+            cursor = conn.cursor()
+            try:
+                for chunk_condition in conditions:
+                    sql, args = sql_builder.gen_select_sql(table_name, cols, chunk_condition, **kwargs)
+                    logging_sql(sql, args, key=log_key)
+                    cursor.execute(sql, args)
+                    rows = cursor.fetchall()
+                    res['result'].extend(convert_rows(rows, cursor) if to_json else rows)
+            except Exception as e:
+                res['success'] = False
+                res['result'] = str(e)
+                if raise_error:
+                    raise db_exception.DbException(e)
+            finally:
+                if self.__metrics is not None:
+                    self.__metrics.observe_query(time.time() - start, success=res['success'])
+
+        return res
+
+    def __select_in_table(self, table_name, cols, condition, field, op, values, *, to_json, raise_error, log_key,
+                          **kwargs):
+        """IN的值写入临时表后查询，临时表只在当前连接中可见，查询后删除"""
+        if op.upper() == 'NOT IN' and None in values:
+            return {'result': [], 'success': True}  # NOT IN中有NULL时不会匹配任何行
+        values = [value for value in dict.fromkeys(values) if value is not None]  # IN NULL不会匹配任何行
+
+        in_table = sql_builder.InTable(f'_in_{uuid.uuid4().hex[:16]}')
+        sql, args = sql_builder.gen_select_sql(
+            table_name, cols, sql_builder.replace_in(condition, field, op, in_table), **kwargs,
+        )
         res = {'result': None, 'success': True}
+        start = time.time()
         with self.__conn as conn:
+            cursor = conn.cursor()
             try:
+                cursor.execute(f'CREATE TEMPORARY TABLE `{in_table}` (`v` {_in_column_type(values)})')
+                for chunk in _chunks(values, lambda value: cursor.mogrify('(%s)', [value]), BULK_CHUNK_SIZE * 10,
+                                     BULK_MAX_BYTES):
+                    cursor.execute(f'INSERT IGNORE INTO `{in_table}` (`v`) VALUES {",".join(chunk)}')  # 忽略排序规则下相同的值
+                logging.info(f'sql: {len(values)}个值写入临时表 {in_table}')
+                logging_sql(sql, args, key=log_key)
+                cursor.execute(sql, args)
+                result = cursor.fetchall()
+                if to_json:
+                    result = convert_rows(result, cursor)
+                res['result'] = result
+            except Exception as e:
+                res['success'] = False
+                res['result'] = str(e)
+                if raise_error:
+                    raise db_exception.DbException(e)
+            finally:
+                try:
+                    cursor.execute(f'DROP TEMPORARY TABLE IF EXISTS `{in_table}`')
+                    conn.commit()
+                except Exception as e:
+                    logging.warning(f'临时表 {in_table} 删除失败: {e}')
+                if self.__metrics is not None:
+                    self.__metrics.observe_query(time.time() - start, success=res['success'])
+
+        return res
+
+    def execute_many(
+            self,
+            sql_with_args_list: Iterable[dict],
+            *,
+            to_json: bool = True,
+            raise_error: bool = True,
+            log_key: str = '',
+            pipeline: int = 0,
+    ):
+        """
+        一个事务中的多条sql语句
+        :param sql_with_args_list: [{'sql': sql, 'args': args, 'result': 结果类型, 'savepoint': 是否使用保存点}, ...]
+            可为生成器（如sql_builder.gen_upsert_sqls()），逐条生成、执行
+            result: rows（查询语句默认）、one（第一行或None）、rowcount（其他语句默认，影响的行数）、lastrowid（自增id）
+            savepoint: 为True时，该语句失败只回滚该语句（结果为None），事务继续执行
+        :param to_json: 是否进行json转换
+        :param raise_error: 是否扔出异常
+        :param log_key:
+        :param pipeline: 连续的非查询语句（结果类型为rowcount、无保存点）合并为一个多语句请求，每个请求最多的语句数，
+            且不超过BULK_MAX_BYTES字节（utf8编码后）。
+            需db_conf['multi_statements']为True。为0则逐条执行
+        :return: 与sql_with_args_list位置对应的结果
+        """
+
+        res = {'result': None, 'success': True}
+        start = time.time()
+        with self.__conn as conn:
+            try:
+                self.__mark_write()
                 conn.begin()
                 cursor = conn.cursor()
-                result = [[]] * len(sql_with_args_list)
-                for sql_with_args in sql_with_args_list:
-                    sql = sql_with_args['sql'].replace('\'%s\'', '%s').strip()
-                    args_list = sql_with_args.get('args', [])
+                result = []
+                batch, batch_bytes = [], 0  # 待合并发送的语句 [(位置, 语句)]
+
+                for index, sql_with_args in enumerate(sql_with_args_list):
+                    result.append(None)
+                    sql, is_select = statement(sql_with_args['sql'])
+                    args_list = sql_with_args.get('args') or []
+                    kind = sql_with_args.get('result') or ('rows' if is_select else 'rowcount')
+                    if kind not in RESULT_KINDS:
+                        raise Exception(f'{kind} 结果类型暂不支持')
                     logging_sql(sql, args_list, key=log_key)
-                    if sql.startswith('SELECT'):
-                        cursor.execute(sql, args_list)
-                        result_ = cursor.fetchall()
-                        if to_json:
-                            result_ = json.loads(json.dumps(result_, cls=DataEncoder.MySQLEncoder))
-                        result[sql_with_args_list.index(sql_with_args)] = result_
+
+                    if pipeline and kind == 'rowcount' and not sql_with_args.get('savepoint') \
+                            and not (args_list and isinstance(args_list[0], (list, tuple))):
+                        text = cursor.mogrify(sql, args_list or None).rstrip().rstrip(';')
+                        text_bytes = len(text.encode('utf8')) + 1
+                        if batch and batch_bytes + text_bytes > BULK_MAX_BYTES:  # 加入后超出时先发送之前的语句
+                            _execute_batch(cursor, batch, result)
+                            batch, batch_bytes = [], 0
+                        batch.append((index, text))
+                        batch_bytes += text_bytes
+                        if len(batch) >= pipeline:
+                            _execute_batch(cursor, batch, result)
+                            batch, batch_bytes = [], 0
+                        continue
+                    if batch:
+                        _execute_batch(cursor, batch, result)
+                        batch, batch_bytes = [], 0
+
+                    if not sql_with_args.get('savepoint'):
+                        result[index] = _execute_statement(cursor, sql, args_list, kind, to_json)
+                        continue
+                    savepoint = f'sp_{index}'
+                    cursor.execute(f'SAVEPOINT {savepoint}')
+                    try:
+                        result[index] = _execute_statement(cursor, sql, args_list, kind, to_json)
+                    except Exception as e:
+                        cursor.execute(f'ROLLBACK TO SAVEPOINT {savepoint}')
+                        logging.warning(f'sql回滚至保存点 {savepoint}: {e}')
                     else:
-                        if not args_list:
-                            res_line = cursor.execute(sql, args_list)
-                        elif isinstance(args_list[0], (list, tuple)):
-                            res_line = cursor.executemany(sql, args_list)
-                        else:
-                            res_line = cursor.execute(sql, args_list)
-                        result[sql_with_args_list.index(sql_with_args)] = res_line
+                        cursor.execute(f'RELEASE SAVEPOINT {savepoint}')
+
+                if batch:
+                    _execute_batch(cursor, batch, result)
                 conn.commit()
                 res['result'] = result
             except Exception as e:
@@ -125,26 +487,102 @@ class Mysql:
                 res['result'] = str(e)
                 if raise_error:
                     raise db_exception.DbException(e)
+            finally:
+                if self.__metrics is not None:
+                    self.__metrics.observe_query(time.time() - start, success=res['success'])
 
         return res
 
 
-def mysql_obj(db_name: int = None, *, db_conf: dict = None, use_pool: bool = True):
+class _Router:
+    """
+    读写分离：查询语句路由到从库（轮询或近期耗时最短），其他语句与事务路由到主库。
+    开启read_your_writes时，同一上下文（线程、协程）写入后的一段时间内，查询也路由到主库
+    """
+
+    probe_interval = 16  # 按耗时路由时，每隔多少次轮询一次，更新各从库的耗时
+
+    def __init__(self, db_conf: dict):
+        self.primary = {key: value for key, value in db_conf.items() if key not in ROUTE_KEYS}
+        self.replicas = [{**self.primary, **replica} for replica in db_conf['replicas']]
+        self.route = db_conf.get('route') or ROUTE_ROUND_ROBIN
+        if self.route not in (ROUTE_ROUND_ROBIN, ROUTE_LEAST_LATENCY):
+            raise Exception(f'{self.route} 路由方式暂不支持')
+        sticky = db_conf.get('read_your_writes') or 0
+        self.sticky = 1 if sticky is True else sticky  # 写入后查询主库的时间（秒）
+        self.__counter = itertools.count()
+        self.__context_key = f'mysql_writes:{self.primary.get("host")}:{self.primary.get("port")}'
+
+    def mark_write(self, db_name):
+        if not self.sticky:
+            return
+        writes = dict(context.get_args(self.__context_key) or {})  # 上下文中的值不原地修改
+        writes[db_name] = time.time()
+        context.set_args(self.__context_key, writes)
+
+    def __recently_written(self, db_name) -> bool:
+        if not self.sticky:
+            return False
+        written_at = (context.get_args(self.__context_key) or {}).get(db_name)
+        return written_at is not None and time.time() - written_at < self.sticky
+
+    def choose(self, db_name, *, readonly: bool, use_pool: bool) -> dict:
+        """
+
+        :param db_name:
+        :param readonly: 是否为查询语句
+        :param use_pool: 是否使用连接池。按耗时路由需要连接池的指标，不使用连接池时轮询
+        :return: 使用的数据库配置
+        """
+        if not readonly or not self.replicas or self.__recently_written(db_name):
+            return self.primary
+
+        count = next(self.__counter)
+        if self.route == ROUTE_ROUND_ROBIN or not use_pool or count % self.probe_interval == 0:
+            return self.replicas[count % len(self.replicas)]
+        latencies = []
+        for replica in self.replicas:
+            metrics = poolDB.PoolDB.find_metrics('mysql', db_name, replica)
+            latencies.append(metrics.latency if metrics is not None else 0)  # 未使用过的从库优先
+        return self.replicas[latencies.index(min(latencies))]
+
+
+_routers = {}  # 冻结的db_conf: _Router()
+
+
+def _router(db_conf: dict) -> _Router:
+    key = poolDB._freeze(db_conf)
+    router = _routers.get(key)
+    if router is None:
+        router = _routers.setdefault(key, _Router(db_conf))
+    return router
+
+
+def mysql_obj(db_name: int = None, *, db_conf: dict = None, use_pool: bool = True, readonly: bool = False):
     """
 
     :param db_name: 库名
-    :param db_conf: 数据库配置。格式参考 Mysql.default_conf
+    :param db_conf: 数据库配置。格式参考 Mysql.default_conf。读写分离时另加：
+        replicas: 从库的配置 [{'host': host, 'port': port}]，未配置的项与主库相同
+        route: 从库的路由方式，round_robin（默认）、least_latency
+        read_your_writes: 写入后多少秒内，同一上下文的查询仍使用主库。True为1秒
     :param use_pool: 是否使用连接池
+    :param readonly: 是否只执行查询语句，配置了从库时路由到从库
     :return:
     """
     if db_name is None:
         db_name = config.MYSQL_DB
 
-    db_config = Mysql.default_conf
+    db_config = dict(Mysql.default_conf)
     if db_conf is not None:
         db_config.update(db_conf)
 
-    return Mysql(db_name, db_config, use_pool=use_pool)
+    router = None
+    if db_config.get('replicas'):
+        router = _router(db_config)
+        db_config = router.choose(db_name, readonly=readonly, use_pool=use_pool)
+
+    return Mysql(db_name, db_config, use_pool=use_pool, router=router)
 
 
 def execute(
@@ -162,10 +600,69 @@ def execute(
     :return:
     """
     args = args or []
-    mysql = mysql_obj(db_name, db_conf=db_conf, use_pool=use_pool)
+    mysql = mysql_obj(db_name, db_conf=db_conf, use_pool=use_pool, readonly=statement(sql)[1])
     return mysql.execute(sql, args, **kwargs)
 
 
+def execute_iter(
+        sql: str, args: list = None,
+        db_name: str = None, db_conf: dict = None,
+        use_pool: bool = True, **kwargs,
+):
+    """
+    流式查询，逐行（或按batch_size分批）返回结果，内存占用恒定
+    :param sql: SELECT * FROM `user` WHERE `id` > %s
+    :param args: [1]
+    :param db_name: 库名
+    :param db_conf: 数据库配置。格式参考 Mysql.default_conf
+    :param use_pool: 是否使用连接池
+    :param kwargs: to_json、batch_size、log_key
+    :return: 生成器
+    """
+    args = args or []
+    mysql = mysql_obj(db_name, db_conf=db_conf, use_pool=use_pool, readonly=statement(sql)[1])
+    return mysql.execute_iter(sql, args, **kwargs)
+
+
+def bulk_insert(
+        table_name: str, rows: Iterable[dict],
+        db_name: str = None, db_conf: dict = None,
+        use_pool: bool = True, **kwargs,
+):
+    """
+    批量插入，按行数与字节数分批提交
+    :param table_name: 表名
+    :param rows: 多行数据（可为生成器）
+    :param db_name: 库名
+    :param db_conf: 数据库配置。格式参考 Mysql.default_conf
+    :param use_pool: 是否使用连接池
+    :param kwargs: chunk_size、max_bytes、upsert_cols、load_data、raise_error、log_key
+    :return:
+    """
+    mysql = mysql_obj(db_name, db_conf=db_conf, use_pool=use_pool)
+    return mysql.bulk_insert(table_name, rows, **kwargs)
+
+
+def select(
+        table_name: str, cols: list, condition: dict = None,
+        db_name: str = None, db_conf: dict = None,
+        use_pool: bool = True, **kwargs,
+):
+    """
+    查询，IN的值很多时分批查询或使用临时表，见 Mysql.select
+    :param table_name: 表名
+    :param cols: 查询的字段
+    :param condition: 查询条件，见sql_builder.gen_wheres()用法
+    :param db_name: 库名
+    :param db_conf: 数据库配置。格式参考 Mysql.default_conf
+    :param use_pool: 是否使用连接池
+    :param kwargs: in_chunk_size、in_table_size、to_json、raise_error、log_key，及sql_builder.gen_select_sql()的参数
+    :return:
+    """
+    mysql = mysql_obj(db_name, db_conf=db_conf, use_pool=use_pool, readonly=True)
+    return mysql.select(table_name, cols, condition, **kwargs)
+
+
 def execute_many(
         sql_with_args_list,
         db_name: str = None, db_conf: dict = None,
@@ -173,7 +670,7 @@ def execute_many(
 ):
     """
     一个事务中的多条sql语句
-    :param sql_with_args_list: [{'sql': sql, 'args': args}, ...]
+    :param sql_with_args_list: [{'sql': sql, 'args': args}, ...]，可为生成器
     :param db_name: 库名
     :param db_conf: 数据库配置。格式参考 Mysql.default_conf
     :param use_pool: 是否使用连接池
@@ -183,7 +680,352 @@ def execute_many(
     return mysql.execute_many(sql_with_args_list, **kwargs)
 
 
+_JSON_TYPES = {str, int, float, type(None)}
+
+
+def _convert_value(value):
+    """单个值的转换，结果与 json.loads(json.dumps(value, cls=DataEncoder.MySQLEncoder)) 相同"""
+    cls = value.__class__
+    if cls in _JSON_TYPES:
+        return value
+    elif cls is datetime.datetime:
+        return _convert_datetime(value)
+    elif cls is datetime.date:
+        return _convert_date(value)
+    elif cls is Decimal:
+        return float(value)
+    elif cls is bytes:
+        return value.decode()
+    return json.loads(json.dumps(value, cls=DataEncoder.MySQLEncoder))  # 其他类型（含不支持的类型）与原实现一致
+
+
+def _convert_datetime(value):
+    if value.__class__ is not datetime.datetime:
+        return _convert_value(value)
+    if value.year < 1000:  # strftime的年份不补0
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return value.isoformat(' ')[:19]  # 与strftime相同，速度约为其2倍
+
+
+def _convert_date(value):
+    if value.__class__ is not datetime.date:
+        return _convert_value(value)
+    if value.year < 1000:
+        return value.strftime('%Y-%m-%d')
+    return value.isoformat()
+
+
+def _convert_decimal(value):
+    return float(value) if value.__class__ is Decimal else _convert_value(value)
+
+
+def _convert_str(value):
+    return value if value.__class__ is str else _convert_value(value)  # 二进制字符集时为bytes
+
+
+# 字段类型对应的转换。不在其中的类型逐个值判断
+_COLUMN_CONVERTERS = {
+    FIELD_TYPE.TINY: None, FIELD_TYPE.SHORT: None, FIELD_TYPE.LONG: None, FIELD_TYPE.LONGLONG: None,
+    FIELD_TYPE.INT24: None, FIELD_TYPE.YEAR: None, FIELD_TYPE.FLOAT: None, FIELD_TYPE.DOUBLE: None,
+    FIELD_TYPE.DECIMAL: _convert_decimal, FIELD_TYPE.NEWDECIMAL: _convert_decimal,
+    FIELD_TYPE.DATETIME: _convert_datetime, FIELD_TYPE.TIMESTAMP: _convert_datetime,
+    FIELD_TYPE.DATE: _convert_date, FIELD_TYPE.NEWDATE: _convert_date,
+    FIELD_TYPE.VARCHAR: _convert_str, FIELD_TYPE.VAR_STRING: _convert_str, FIELD_TYPE.STRING: _convert_str,
+    FIELD_TYPE.JSON: _convert_str, FIELD_TYPE.ENUM: _convert_str,
+    FIELD_TYPE.BLOB: _convert_str, FIELD_TYPE.TINY_BLOB: _convert_str,
+    FIELD_TYPE.MEDIUM_BLOB: _convert_str, FIELD_TYPE.LONG_BLOB: _convert_str,
+}
+
+
+def row_converters(cursor) -> list:
+    """
+    根据查询结果的字段类型，确定每个字段的转换方法（整数、浮点数字段无需转换）
+    :param cursor: 已执行查询的DictCursor、SSDictCursor
+    :return: [(字段名, 转换方法)]
+    """
+    description = cursor.description or ()
+    fields = getattr(cursor, '_fields', None) or [column[0] for column in description]  # 同名字段为 表名.字段名
+    converters = []
+    for field, column in zip(fields, description):
+        converter = _COLUMN_CONVERTERS.get(column[1], _convert_value)
+        if converter is not None:
+            converters.append((field, converter))
+    return converters
+
+
+def convert_rows(rows: list, cursor=None, *, converters: list = None) -> list:
+    """
+    MySQL类型转为json类型（datetime、Decimal等），结果与经过 DataEncoder.MySQLEncoder 的json序列化再反序列化相同
+    :param rows: [{字段: 值}]，原地转换
+    :param cursor: 查询的游标，按字段类型转换；为空则逐个值判断
+    :param converters: 已确定的转换方法，见 row_converters
+    :return:
+    """
+    if not rows:
+        return list(rows)
+    if converters is None and cursor is not None:
+        converters = row_converters(cursor)
+    elif converters is None:
+        converters = [(field, _convert_value) for field in rows[0]]
+    if converters:
+        for row in rows:
+            for field, converter in converters:
+                value = row[field]
+                if value is not None:
+                    row[field] = converter(value)
+    return list(rows)
+
+
+def scan(
+        table_name: str, cols: list = None,
+        *,
+        key: str = 'id',
+        condition: dict = None,
+        batch_size: int = SCAN_BATCH_SIZE,
+        slices: int = 1,
+        to_json: bool = True,
+        log_key: str = '',
+        db_name: str = None, db_conf: dict = None,
+        use_pool: bool = True,
+):
+    """
+    按主键分页（keyset）遍历表：每页 WHERE key > 上一页最后的key ORDER BY key LIMIT batch_size，
+    页数再多也不需要OFFSET扫描前面的行
+    :param table_name: 表名
+    :param cols: 查询的字段，为空则查询全部。不含key时会加上
+    :param key: 分页的字段，需有索引且唯一（一般为主键）
+    :param condition: 其他查询条件，见sql_builder.gen_wheres()用法
+    :param batch_size: 每页的行数
+    :param slices: 将key的范围（需为整数）等分为多段，通过连接池并发读取。大于1时行的顺序不保证
+    :param to_json: 是否进行json转换
+    :param log_key:
+    :param db_name: 库名
+    :param db_conf: 数据库配置。格式参考 Mysql.default_conf
+    :param use_pool: 是否使用连接池
+    :return: 生成器，逐行返回
+    """
+    cols = list(cols or ['%*'])
+    if '%*' not in cols and key not in cols:
+        cols.append(key)
+
+    def read(lower=None, upper=None):
+        """(lower, upper] 区间内的行，每次返回一页"""
+        last = lower
+        while True:
+            page_condition = dict(condition or {})
+            key_condition = dict(page_condition.get(key) or {})
+            if last is not None:
+                key_condition['>'] = last
+            if upper is not None:
+                key_condition['<='] = upper
+            if key_condition:
+                page_condition[key] = key_condition
+            sql, args = sql_builder.gen_select_sql(
+                table_name, cols, page_condition, order_by=[(key, 'ASC')], limit=batch_size,
+            )
+            mysql = mysql_obj(db_name, db_conf=db_conf, use_pool=use_pool, readonly=True)
+            rows = mysql.execute(sql, args, to_json=to_json, log_key=log_key)['result']
+            if rows:
+                yield rows
+            if len(rows) < batch_size:
+                break
+            last = rows[-1][key]
+
+    if slices <= 1:
+        for rows in read():
+            yield from rows
+        return
+
+    sql, args = sql_builder.gen_key_range_sql(table_name, key, condition)
+    mysql = mysql_obj(db_name, db_conf=db_conf, use_pool=use_pool, readonly=True)
+    bounds = mysql.execute(sql, args, log_key=log_key)['result'][0]
+    min_key, max_key = bounds['min_key'], bounds['max_key']
+    if min_key is None:
+        return
+    if not isinstance(min_key, int) or not isinstance(max_key, int):
+        raise Exception(f'{key} 不是整数，不支持分段并发读取')
+
+    step = -(-(max_key - min_key + 1) // slices)  # 向上取整
+    ranges = [(lower - 1, min(lower + step - 1, max_key)) for lower in range(min_key, max_key + 1, step)]
+    for rows in _read_parallel(read, ranges):
+        yield from rows
+
+
+def _read_parallel(read, ranges: list):
+    """
+    多个区间在线程中并发读取，结果通过有界队列返回（读取快于消费时阻塞，内存占用有限）
+    :param read: 读取单个区间的方法，返回生成器
+    :param ranges: [(lower, upper)]
+    :return: 生成器，每次返回一页
+    """
+    pages = queue.Queue(maxsize=len(ranges) * 2)
+    stop = threading.Event()  # 调用方停止读取（关闭生成器）时，线程随之结束
+    done = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def worker(lower, upper):
+        try:
+            for rows in read(lower, upper):
+                if not put(rows):
+                    return
+        except Exception as e:
+            put(e)
+        finally:
+            put(done)
+
+    with ThreadPoolExecutor(max_workers=len(ranges), thread_name_prefix='mysql-scan') as executor:
+        for lower, upper in ranges:
+            executor.submit(worker, lower, upper)
+        try:
+            remaining = len(ranges)
+            while remaining:
+                item = pages.get()
+                if item is done:
+                    remaining -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            stop.set()
+
+
+def _execute_statement(cursor, sql: str, args: list, kind: str, to_json: bool):
+    """
+    执行单条语句
+    :param kind: 结果类型，见 RESULT_KINDS
+    :return:
+    """
+    if args and isinstance(args[0], (list, tuple)):
+        rowcount = cursor.executemany(sql, args)
+    else:
+        rowcount = cursor.execute(sql, args)
+
+    if kind == 'rowcount':
+        return rowcount
+    if kind == 'lastrowid':
+        return cursor.lastrowid
+    rows = cursor.fetchall()
+    if to_json:
+        rows = convert_rows(rows, cursor)
+    if kind == 'one':
+        return rows[0] if rows else None
+    return rows
+
+
+def _execute_batch(cursor, batch: list, result: list):
+    """
+    多条语句合并为一个请求发送，依次读取每条语句影响的行数
+    :param batch: [(位置, 已填充参数的语句)]
+    :param result: 结果写入对应的位置
+    :return:
+    """
+    cursor.execute(';'.join(text for _, text in batch))
+    for n, (index, _) in enumerate(batch):
+        if n:
+            cursor.nextset()
+        result[index] = cursor.rowcount
+
+
+def _chunks(rows, encode, chunk_size: int, max_bytes: int, *, reserved: int = 0):
+    """
+    按行数与字节数分批
+    :param rows:
+    :param encode: 单行编码为字符串的方法
+    :param chunk_size: 每批的最大行数
+    :param max_bytes: 每批的最大字节数（utf8编码后），单行超出时单独一批
+    :param reserved: 每批中行以外的字节数（语句的前缀、后缀）
+    :return: 生成器，每次返回一批编码后的行
+    """
+    chunk, size = [], reserved
+    for row in rows:
+        item = encode(row)
+        item_size = len(item.encode('utf8')) + 1
+        if chunk and (len(chunk) >= chunk_size or size + item_size > max_bytes):
+            yield chunk
+            chunk, size = [], reserved
+        chunk.append(item)
+        size += item_size
+    if chunk:
+        yield chunk
+
+
+def _in_column_type(values: list) -> str:
+    """临时表的字段类型：整数为BIGINT，其他按最长的值为VARCHAR"""
+    if all(isinstance(value, int) and not isinstance(value, bool) for value in values):
+        return 'BIGINT NOT NULL PRIMARY KEY'
+    length = max([len(value if isinstance(value, (str, bytes)) else str(value)) for value in values] or [1])
+    if length <= 255:
+        return f'VARCHAR({length}) NOT NULL PRIMARY KEY'
+    return f'VARCHAR({length}) NOT NULL'
+
+
+def _csv_value(value) -> str:
+    """LOAD DATA的字段值（双引号包围，反斜杠转义）"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, (int, float, Decimal)):
+        return str(value)
+    if isinstance(value, bytes):
+        value = value.decode()
+    elif not isinstance(value, str):
+        value = str(value)
+    value = value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\r', '\\r').replace('\0', '\\0')
+    return f'"{value}"'
+
+
+def _load_data(cursor, sql: str, content: str):
+    """
+    pymysql只能按文件路径读取LOAD DATA LOCAL的内容，内存中的CSV写入临时文件后导入
+    """
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', suffix='.csv', delete=False) as f:
+        f.write(content)
+    try:
+        return cursor.execute(sql, [f.name])
+    finally:
+        os.remove(f.name)
+
+
+def _abort_stream(conn):
+    """
+    关闭流式查询所在的pymysql连接，服务端停止发送剩余的行。
+    连接池的连接（PooledDB -> SteadyDB -> pymysql）仍会归还，下次使用时由SteadyDB重新连接
+    """
+    raw = conn
+    while not isinstance(raw, pymysql.connections.Connection) and hasattr(raw, '_con'):
+        raw = raw._con
+    try:
+        raw.close()
+    except Exception as e:
+        logging.warning(f'流式查询中止时关闭连接失败: {e}')
+
+
+@functools.lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def statement(sql: str):
+    """
+    sql语句的预处理结果，按sql文本缓存（相同的语句只处理一次）。
+    pymysql不支持服务端预处理语句，只缓存处理后的文本与语句类型
+    :param sql:
+    :return: (处理后的sql, 是否为查询语句)
+    """
+    sql = sql.replace('\'%s\'', '%s').strip()
+    return sql, sql[:6].upper() == 'SELECT'
+
+
 def logging_sql(sql, args, key: str = None):
+    if not logging.getLogger().isEnabledFor(logging.INFO):  # 不输出时不拼接sql
+        return
+
     for item in args:
         if isinstance(item, int) or isinstance(item, float):
             sql = sql.replace('%s', str(item), 1)
@@ -202,7 +1044,223 @@ def logging_sql(sql, args, key: str = None):
 
 
 if __name__ == "__main__":
-    ...
+    # 10万行查询结果的类型转换：json序列化再反序列化 与 按字段类型转换 对比：python -m dao.mysqlDB
+    import copy
+    from types import SimpleNamespace
+
+    def bench_convert(count: int = 100000):
+        fake_cursor = SimpleNamespace(description=[
+            ('id', FIELD_TYPE.LONGLONG), ('name', FIELD_TYPE.VAR_STRING), ('data', FIELD_TYPE.BLOB),
+            ('price', FIELD_TYPE.NEWDECIMAL), ('score', FIELD_TYPE.DOUBLE),
+            ('created', FIELD_TYPE.DATETIME), ('day', FIELD_TYPE.DATE),
+        ])
+        now = datetime.datetime(2026, 10, 18, 12, 30, 45)
+        rows = [
+            {
+                'id': i, 'name': f'name_{i}', 'data': b'bytes' if i % 3 else None,
+                'price': Decimal(f'{i}.25'), 'score': i / 7,
+                'created': now, 'day': now.date() if i % 5 else None,
+            }
+            for i in range(count)
+        ]
+
+        typed_rows, untyped_rows = copy.deepcopy(rows), copy.deepcopy(rows)  # convert_rows为原地转换
+
+        start = time.time()
+        expected = json.loads(json.dumps(rows, cls=DataEncoder.MySQLEncoder))
+        json_cost = time.time() - start
+        start = time.time()
+        result = convert_rows(typed_rows, fake_cursor)
+        typed_cost = time.time() - start
+        start = time.time()
+        untyped = convert_rows(untyped_rows)
+        untyped_cost = time.time() - start
+
+        assert result == expected and untyped == expected, '转换结果不一致'
+        print(f'json round-trip   {json_cost * 1000:>8.1f} ms')
+        print(f'typed columns     {typed_cost * 1000:>8.1f} ms  x{json_cost / typed_cost:.1f}')
+        print(f'per-value         {untyped_cost * 1000:>8.1f} ms  x{json_cost / untyped_cost:.1f}')
+
+    def bench_statement(times: int = 100000):
+        """单次执行前sql预处理与日志拼接的耗时（日志级别为WARNING）"""
+        logging.getLogger().setLevel(logging.WARNING)
+        sql = " SELECT * FROM `user` WHERE `id` = '%s' AND `name` = '%s' AND `age` > '%s' "
+        args = [1, "test'name", 18]
+
+        def legacy():
+            sql_ = sql.replace('\'%s\'', '%s').strip()
+            for item in args:  # 原logging_sql，不论日志级别都拼接
+                if isinstance(item, (int, float)):
+                    sql_ = sql_.replace('%s', str(item), 1)
+                else:
+                    sql_ = sql_.replace('%s', f"'{item}'", 1)
+            logging.info(f'sql: {sql_}')
+            return sql_.startswith('SELECT') or sql_.startswith('select')
+
+        def cached():
+            sql_, is_select = statement(sql)
+            logging_sql(sql_, args)
+            return is_select
+
+        for name, func in (('legacy', legacy), ('cached', cached)):
+            start = time.time()
+            for _ in range(times):
+                func()
+            print(f'{name:<8} {(time.time() - start) / times * 1e6:>6.2f} us/call')
+
+    def bench_result_index(count: int = 10000):
+        """execute_many结果位置的记录：原list.index()查找 与 enumerate 对比（1万条语句的事务）"""
+        items = [{'sql': 'UPDATE `user` SET `age` = %s WHERE `id` = %s', 'args': [i % 100, i]} for i in range(count)]
+
+        start = time.time()
+        result = [[]] * len(items)
+        for item in items:
+            result[items.index(item)] = 1
+        legacy_cost = time.time() - start
+
+        start = time.time()
+        result = [None] * len(items)
+        for index, item in enumerate(items):
+            result[index] = 1
+        cost = time.time() - start
+        print(f'index()   {legacy_cost * 1000:>8.1f} ms')
+        print(f'enumerate {cost * 1000:>8.1f} ms')
+
+    def bench_execute_many(count: int = 10000, db_conf: dict = None):
+        """1万条语句的事务：逐条执行 与 多语句合并发送 对比（需可用的MySQL）"""
+        db_conf = {**(db_conf or {}), 'multi_statements': True}
+        execute('CREATE TABLE IF NOT EXISTS `bench_many` (`id` INT PRIMARY KEY, `age` INT)', db_conf=db_conf)
+        bulk_insert('bench_many', ({'id': i, 'age': 0} for i in range(count)), upsert_cols=['age'], db_conf=db_conf)
+        items = [{'sql': 'UPDATE `bench_many` SET `age` = %s WHERE `id` = %s', 'args': [i % 100, i]} for i in range(count)]
+        for pipeline in (0, 100, 1000):
+            start = time.time()
+            execute_many(items, db_conf=db_conf, pipeline=pipeline)
+            print(f'pipeline={pipeline:<5} {count / (time.time() - start):>10.0f} statements/s')
+
+    def check_select_chunks(count: int = 2500, chunk_size: int = 1000):
+        """
+        IN分多条语句查询时，所有语句使用同一个连接池连接（退出with即归还，不能再次使用）。
+        使用DBUtils的PooledDB与不连接数据库的连接，每条语句返回参数对应的行
+        """
+        from dbutils.pooled_db import PooledDB
+
+        class FakeCursor:
+            description = (('id', FIELD_TYPE.LONGLONG, None, None, None, None, None),)
+
+            def __init__(self):
+                self.rows = []
+
+            def execute(self, sql, args=None):
+                self.rows = [{'id': value} for value in args or []]
+                return len(self.rows)
+
+            def fetchall(self):
+                return self.rows
+
+            def close(self): ...
+
+        class FakeConnection:
+            def cursor(self, *args):
+                return FakeCursor()
+
+            def begin(self): ...
+
+            def commit(self): ...
+
+            def rollback(self): ...
+
+            def close(self): ...
+
+        def connect():
+            return FakeConnection()
+
+        connect.threadsafety = 1
+        pool = PooledDB(connect, maxconnections=1, failures=(Exception,))
+        mysql = Mysql.__new__(Mysql)
+        mysql._Mysql__conn, mysql._Mysql__metrics, mysql._Mysql__router = pool.connection(), None, None
+        ids = list(range(count))
+        res = mysql.select('user', ['id'], {'id': {'in': ids}}, in_chunk_size=chunk_size, raise_error=False)
+        assert res['success'], res['result']
+        assert [row['id'] for row in res['result']] == ids
+        print(f'select chunks ok: {count} ids, {-(-count // chunk_size)} statements, one pooled connection')
+
+    def check_stream_abort(count: int = 100000, batch_size: int = 100):
+        """
+        流式查询中途break时，不读取剩余的行，而是关闭连接；读取完时正常关闭游标
+        """
+        from dbutils.pooled_db import PooledDB
+
+        class FakeSSCursor:
+            description = (('id', FIELD_TYPE.LONGLONG, None, None, None, None, None),)
+
+            def __init__(self, connection):
+                self.connection = connection
+
+            def execute(self, sql, args=None):
+                if self.connection.closed:  # SteadyDB捕获后重新连接
+                    raise pymysql.err.InterfaceError(0, '')
+                self.connection.rows = iter(range(count))
+
+            def fetchmany(self, size):
+                return [{'id': value} for value in itertools.islice(self.connection.rows, size)]
+
+            def close(self):  # 与SSCursor一致，读取剩余的行，连接已关闭时读取失败
+                if self.connection.closed:
+                    raise pymysql.err.InterfaceError(0, '')
+                for _ in self.connection.rows:
+                    self.connection.drained += 1
+
+        class FakeConnection:
+            def __init__(self):
+                self.rows = iter(())
+                self.drained = 0
+                self.closed = False
+
+            def cursor(self, *args):
+                return FakeSSCursor(self)
+
+            def rollback(self): ...
+
+            def close(self):
+                self.closed = True
+
+        connections = []
+
+        def connect():
+            connections.append(FakeConnection())
+            return connections[-1]
+
+        connect.threadsafety = 1
+        pool = PooledDB(connect, maxconnections=1, failures=(Exception,))
+
+        def pooled_mysql():
+            mysql = Mysql.__new__(Mysql)
+            mysql._Mysql__conn, mysql._Mysql__metrics, mysql._Mysql__router = pool.connection(), None, None
+            return mysql
+
+        for row in pooled_mysql().execute_iter('SELECT `id` FROM `user`', [], batch_size=batch_size):
+            break
+        assert connections[0].closed and connections[0].drained == 0, vars(connections[0])
+
+        read = sum(len(rows) for rows in pooled_mysql().execute_iter('SELECT `id` FROM `user`', [],
+                                                                     batch_size=batch_size))
+        assert read == count and len(connections) == 2 and not connections[1].closed, (read, len(connections))
+        print(f'stream abort ok: break closes the connection without reading the remaining {count - batch_size} rows, '
+              f'next use reconnects')
+
+    bench_convert()
+    bench_statement()
+    bench_result_index()
+    check_select_chunks()
+    check_stream_abort()
+    # bench_execute_many()
+
+    # # 批量插入（需可用的MySQL），返回行数、批次数与每秒行数
+    # tmp_rows = ({'id': i, 'name': f'name_{i}'} for i in range(1000000))
+    # print(bulk_insert('user', tmp_rows, chunk_size=5000, upsert_cols=['name']))
+    # print(bulk_insert('user', tmp_rows, load_data=True, db_conf={'local_infile': True}))
+    # # 字段不同的多行upsert，语句逐条生成、在一个事务中执行
+    # print(execute_many(sql_builder.gen_upsert_sqls('user', tmp_rows, ['name'])))
 
     # tmp_sql = 'show databases;'
     # tmp_res = execute(tmp_sql, use_pool=True)
@@ -5,19 +5,452 @@
 
 import atexit
 import hashlib
+import json
+import logging
+import os
 import threading
+import time
 
 from dbutils.pooled_db import PooledDB
 import redis
 import pymysql
+from pymysql.constants import CLIENT
 from elasticsearch import Elasticsearch
+from pymongo import monitoring
+
+from dao import db
+from dao.db_exception import PoolTimeout
+from dao.pool_metrics import PoolMetrics
+
+# 连接池参数的默认值，可通过 db_conf['pool'] 按连接池覆盖
+MYSQL_POOL_OPTIONS = {
+    'max_connections': 100,  # 最大连接数
+    'min_idle': 3,  # 初始化时创建的空闲连接数
+    'max_idle': 0,  # 最大空闲连接数，0为不限制
+    'max_usage': 30,  # 单个连接的最大使用次数，超出后重连。0为不限制
+    'max_lifetime': 0,  # 单个连接的最长存活时间（秒），归还时超出则关闭。0为不限制
+    'ping': 7,  # 检查连接是否可用的时机。0：不检查；1：取出时；2：创建游标时；4：执行时。可相加组合
+    'acquire_timeout': None,  # 获取连接的超时时间（秒），超时扔出PoolTimeout。None为一直等待
+}
+MYSQL_CONNECT_TIMEOUT = 10  # 建立连接的超时时间（秒）
+MYSQL_READ_TIMEOUT = 20  # 读取结果的超时时间（秒）
+MYSQL_WRITE_TIMEOUT = 60  # 发送语句的超时时间（秒）
+REDIS_POOL_OPTIONS = {
+    'max_connections': 100,  # 最大连接数
+    'health_check_interval': 0,  # 连接空闲超过该时间（秒）后，使用前先检查
+    'acquire_timeout': None,  # 获取连接的超时时间（秒），超时扔出PoolTimeout。None为连接数耗尽时立即报错
+}
+
+MONGO_POOL_OPTIONS = {
+    'max_connections': 100,  # 最大连接数（maxPoolSize）
+    'min_idle': 0,  # 最少保持的连接数（minPoolSize）
+    'max_idle_time': None,  # 连接空闲超过该时间（秒）后关闭。None为不限制
+    'acquire_timeout': None,  # 获取连接的超时时间（秒），超时扔出异常。None为一直等待
+}
+
+
+def pool_options(mode: str, db_conf: dict) -> dict:
+    """
+    连接池参数：默认值与 db_conf['pool'] 合并
+    :param mode:
+    :param db_conf:
+    :return:
+    """
+    defaults = {
+        'mysql': MYSQL_POOL_OPTIONS, 'redis': REDIS_POOL_OPTIONS, 'mongo': MONGO_POOL_OPTIONS,
+    }.get(mode.lower(), {})
+    options = dict(defaults)
+    for key, value in ((db_conf or {}).get('pool') or {}).items():
+        if key not in defaults:
+            raise Exception(f'{key} 连接池参数暂不支持')
+        options[key] = value
+    return options
+
+
+class _MysqlConnection(pymysql.connections.Connection):
+    """记录关闭次数的连接"""
+
+    metrics = None
+    _closed_counted = False
+
+    def __count_close(self):
+        if self.metrics is not None and not self._closed_counted:
+            self._closed_counted = True
+            self.metrics.incr('closed')
+
+    def close(self):
+        self.__count_close()
+        super().close()
+
+    def _force_close(self):
+        self.__count_close()
+        super()._force_close()
+
+
+class _MysqlCreator:
+    """PooledDB的creator，记录新建连接的次数"""
+
+    dbapi = pymysql
+    threadsafety = pymysql.threadsafety
+
+    def __init__(self, metrics: PoolMetrics):
+        self.metrics = metrics
+
+    def connect(self, *args, **kwargs):
+        conn = _MysqlConnection(*args, **kwargs)
+        conn.metrics = self.metrics
+        conn.created_at = time.time()
+        self.metrics.incr('created')
+        return conn
+
+
+class _PooledDB(PooledDB):
+    """
+    记录获取连接等待时间的PooledDB，支持获取连接超时、连接最长存活时间
+    """
+
+    def __init__(
+            self, *args,
+            metrics: PoolMetrics, acquire_timeout: float = None, max_lifetime: float = 0,
+            **kwargs,
+    ):
+        self.metrics = metrics
+        self.acquire_timeout = acquire_timeout
+        self.max_lifetime = max_lifetime
+        maxconnections = kwargs.get('maxconnections')
+        # 有超时时间时，由信号量控制连接数量，PooledDB内部不再阻塞
+        self._slots = threading.BoundedSemaphore(maxconnections) if acquire_timeout and maxconnections else None
+        super().__init__(_MysqlCreator(metrics), *args, **kwargs)
+
+    def connection(self, shareable=True):
+        start = time.time()
+        if self._slots is not None and not self._slots.acquire(timeout=self.acquire_timeout):
+            self.metrics.incr('acquire_timeouts')
+            raise PoolTimeout(f'获取连接超时（{self.acquire_timeout}s），连接数已达上限 {self._maxconnections}')
+        try:
+            con = super().connection(shareable)
+        except Exception:
+            if self._slots is not None:
+                self._slots.release()
+            self.metrics.incr('acquire_errors')
+            raise
+        self.metrics.observe_wait(time.time() - start)
+        return con
+
+    def cache(self, con):
+        try:
+            created_at = getattr(con._con, 'created_at', None)
+            if self.max_lifetime and created_at is not None and time.time() - created_at > self.max_lifetime:
+                with self._lock:  # 超出存活时间，关闭而不放回空闲连接
+                    con.close()
+                    self._connections -= 1
+                    self._lock.notify()
+            else:
+                super().cache(con)
+        finally:
+            if self._slots is not None:
+                self._slots.release()
+
+    def gauges(self) -> dict:
+        return {
+            'checked_out': self._connections,
+            'idle': len(self._idle_cache),
+            'max_connections': self._maxconnections,
+        }
+
+
+class _RedisPoolMetrics:
+    """记录获取连接等待时间及新建连接次数"""
+
+    metrics = None
+
+    def get_connection(self, command_name, *keys, **options):
+        start = time.time()
+        try:
+            connection = super().get_connection(command_name, *keys, **options)
+        except redis.ConnectionError as e:
+            if self._is_timeout(e):
+                self.metrics.incr('acquire_timeouts')
+                raise PoolTimeout(f'获取连接超时（{getattr(self, "timeout", None)}s），连接数已达上限 {self.max_connections}')
+            self.metrics.incr('acquire_errors')
+            raise
+        except Exception:
+            self.metrics.incr('acquire_errors')
+            raise
+        self.metrics.observe_wait(time.time() - start)
+        return connection
+
+    def make_connection(self):
+        connection = super().make_connection()
+        self.metrics.incr('created')
+        return connection
+
+    @staticmethod
+    def _is_timeout(e: Exception) -> bool:
+        return False
+
+
+class _RedisPool(_RedisPoolMetrics, redis.ConnectionPool):
+    """连接数耗尽时立即报错"""
+
+    def __init__(self, *args, metrics: PoolMetrics, **kwargs):
+        self.metrics = metrics
+        super().__init__(*args, **kwargs)
+
+    def gauges(self) -> dict:
+        return {
+            'checked_out': len(self._in_use_connections),
+            'idle': len(self._available_connections),
+            'max_connections': self.max_connections,
+        }
+
+
+class _BlockingRedisPool(_RedisPoolMetrics, redis.BlockingConnectionPool):
+    """连接数耗尽时等待，超时扔出PoolTimeout"""
+
+    def __init__(self, *args, metrics: PoolMetrics, **kwargs):
+        self.metrics = metrics
+        super().__init__(*args, **kwargs)
+
+    @staticmethod
+    def _is_timeout(e: Exception) -> bool:
+        return str(e) == 'No connection available.'
+
+    def gauges(self) -> dict:
+        created = len(self._connections)
+        idle = sum(1 for connection in list(self.pool.queue) if connection is not None)
+        return {
+            'checked_out': created - idle,
+            'idle': idle,
+            'max_connections': self.max_connections,
+        }
+
+
+class _MongoPoolListener(monitoring.ConnectionPoolListener):
+    """通过pymongo的连接池事件记录指标"""
+
+    def __init__(self, metrics: PoolMetrics):
+        self.metrics = metrics
+        self._local = threading.local()  # 当前线程开始获取连接的时间
+        self._lock = threading.Lock()
+        self.checked_out = 0
+        self.opened = 0
+
+    def pool_created(self, event): ...
+
+    def pool_ready(self, event): ...
+
+    def pool_cleared(self, event): ...
+
+    def pool_closed(self, event): ...
+
+    def connection_created(self, event):
+        with self._lock:
+            self.opened += 1
+        self.metrics.incr('created')
+
+    def connection_ready(self, event): ...
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.opened -= 1
+        self.metrics.incr('closed')
+
+    def connection_check_out_started(self, event):
+        self._local.start = time.time()
+
+    def connection_check_out_failed(self, event):
+        if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+            self.metrics.incr('acquire_timeouts')
+        else:
+            self.metrics.incr('acquire_errors')
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checked_out += 1
+        start = getattr(self._local, 'start', None)
+        self.metrics.observe_wait(time.time() - start if start else 0)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+
+class _MongoPool:
+    """进程内共享的MongoClient（自带连接池）"""
+
+    def __init__(self, db_conf: dict, options: dict, metrics: PoolMetrics):
+        self.max_connections = options['max_connections']
+        self.listener = _MongoPoolListener(metrics)
+        kwargs = {
+            'maxPoolSize': options['max_connections'],
+            'minPoolSize': options['min_idle'],
+            'event_listeners': [self.listener],
+        }
+        if options['max_idle_time']:
+            kwargs['maxIdleTimeMS'] = int(options['max_idle_time'] * 1000)
+        if options['acquire_timeout']:
+            kwargs['waitQueueTimeoutMS'] = int(options['acquire_timeout'] * 1000)
+        self.client = db.mongo_coon(db_conf, **kwargs)
+
+    def connection(self, db_name):
+        return _MongoConnection(self.client, db_name)
+
+    def gauges(self) -> dict:
+        return {
+            'checked_out': self.listener.checked_out,
+            'idle': self.listener.opened - self.listener.checked_out,
+            'max_connections': self.max_connections,
+        }
+
+    def close(self):
+        self.client.close()
+
+
+class _MongoConnection:
+    """与db.Db相同的使用方式：with返回数据库对象，退出时不关闭共享的MongoClient"""
+
+    def __init__(self, client, db_name):
+        self.client = client
+        self.db_name = db_name
+
+    def __enter__(self):
+        return self.client[self.db_name]
+
+    def __exit__(self, exc_type, exc_val, exc_tb): ...
+
+
+def _pool_db_name(mode: str, db_name):
+    """登记连接池时使用的库名。mongo同一服务器（配置）的各个库共用一个MongoClient，不区分库名"""
+    return None if mode.lower() == 'mongo' else db_name
+
+
+def _freeze(value):
+    """转换为可hash的值，作为连接池的key"""
+    if isinstance(value, dict):
+        try:
+            return frozenset(value.items())
+        except TypeError:  # 含dict等不可hash的值
+            return frozenset([(k, _freeze(v)) for k, v in value.items()])
+    if isinstance(value, (list, set)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _create_pool(mode: str, db_name, db_conf: dict, metrics: PoolMetrics):
+    options = pool_options(mode, db_conf)
+    if mode.lower() == 'mysql':
+        host = db_conf['host']
+        port = db_conf['port']
+        user = db_conf['user']
+        password = db_conf['password']
+        database = db_name
+
+        pool = _PooledDB(
+            metrics=metrics,
+            host=host,
+            port=port,
+            user=user,
+            password=password,
+            database=database,
+            autocommit=True,
+            charset='utf8mb4',
+            connect_timeout=MYSQL_CONNECT_TIMEOUT,
+            read_timeout=MYSQL_READ_TIMEOUT,
+            write_timeout=MYSQL_WRITE_TIMEOUT,
+            maxconnections=options['max_connections'],
+            mincached=options['min_idle'],
+            maxcached=options['max_idle'],
+            maxusage=options['max_usage'],
+            blocking=True,
+            cursorclass=pymysql.cursors.DictCursor,
+            local_infile=bool(db_conf.get('local_infile')),  # LOAD DATA LOCAL INFILE，见 mysqlDB.bulk_insert
+            client_flag=CLIENT.MULTI_STATEMENTS if db_conf.get('multi_statements') else 0,  # 见 mysqlDB.execute_many
+            ping=options['ping'],
+            acquire_timeout=options['acquire_timeout'],
+            max_lifetime=options['max_lifetime'],
+        )
+    elif mode.lower() == 'redis':
+        host = db_conf['host']
+        port = db_conf['port']
+        password = db_conf['password']
+        database = db_name
+
+        kwargs = {
+            'metrics': metrics,
+            'host': host,
+            'port': port,
+            'password': password,
+            'db': database,
+            'max_connections': options['max_connections'],
+            'health_check_interval': options['health_check_interval'],
+            'decode_responses': True,
+        }
+        if options['acquire_timeout']:
+            pool = _BlockingRedisPool(timeout=options['acquire_timeout'], **kwargs)
+        else:
+            pool = _RedisPool(**kwargs)
+    elif mode.lower() == 'mongo':
+        pool = _MongoPool(db_conf, options, metrics)
+    elif mode.lower() == 'elasticsearch':
+        host = db_conf['host']
+        port = db_conf['port']
+        user = db_conf['user']
+        password = db_conf['password']
+
+        pool = Elasticsearch(
+            hosts=f'http://{host}:{port}',
+            http_auth=(user, password),
+            sniff_on_node_failure=True,
+            sniff_timeout=60,
+        )
+    else:
+        raise Exception(f'mode错误，当前未实现{mode}模式')
+    return pool
+
+
+class _PoolRecord:
+    """已创建的连接池"""
+
+    def __init__(self, key: str, mode: str, db_name, db_conf: dict, pool, metrics: PoolMetrics):
+        self.key = key
+        self.mode = mode
+        self.db_name = db_name
+        self.db_conf = db_conf
+        self.pool = pool
+        self.metrics = metrics
+        self.pid = os.getpid()  # 创建连接池的进程，fork后子进程不可使用
+
+    def drain(self):
+        """
+        关闭空闲连接，连接池仍可继续使用。
+        mongo的空闲连接由MongoClient按max_idle_time关闭，且MongoClient关闭后不能再使用，此处不处理
+        """
+        try:
+            if self.mode.lower() == 'mysql':
+                self.pool.close()
+            elif self.mode.lower() == 'redis':
+                self.pool.disconnect(inuse_connections=False)
+        except Exception as e:
+            logging.error(f'连接池 {self.key} 清理空闲连接失败: {e}')
+
+    def close(self):
+        try:
+            if self.mode.lower() == 'redis':
+                self.pool.disconnect()
+            else:
+                self.pool.close()
+        except Exception as e:
+            logging.error(f'连接池 {self.key} 关闭失败: {e}')
 
 
 class PoolDB:
 
     # instance = None
     _lock = threading.RLock()
-    __pools = {}  # key: PooledDB()
+    __pools = {}  # (mode, db_name, 冻结的db_conf): _PoolRecord()
+    __keys = {}  # key: (mode, db_name, 冻结的db_conf)
+    __inherited = []  # fork自父进程的连接池。子进程中只保留引用，不使用也不关闭，避免释放时关闭父进程的socket
 
     # 不使用单例，否则属性会冲突覆盖
     # def __new__(cls, *args, **kwargs):
@@ -36,104 +469,175 @@ class PoolDB:
         self._db_name = db_name
         self._db_conf = db_conf
 
-        self.__key = hashlib.md5(f'{self._mode}/{self._db_name}/{self._db_conf}'.encode(encoding='UTF-8')).hexdigest()
-        if self.__key not in PoolDB.__pools:
-            self._prepare()
-        self.__pool = PoolDB.__pools[self.__key]
+        self.__frozen = (mode, _pool_db_name(mode, db_name), _freeze(db_conf))
+        self.__record = self.__current()
+
+    def __current(self) -> _PoolRecord:
+        """当前进程的连接池，不存在时创建"""
+        record = PoolDB.__pools.get(self.__frozen)
+        if record is None or record.pid != os.getpid():
+            with PoolDB._lock:  # 同时首次使用时，只创建一个连接池
+                record = PoolDB.__pools.get(self.__frozen)
+                if record is None or record.pid != os.getpid():
+                    record = self._prepare()
+        return record
 
     @property
     def key(self):
-        return self.__key
-
-    def _prepare(self):
-        if self._mode.lower() == 'mysql':
-            creator = pymysql
-            host = self._db_conf['host']
-            port = self._db_conf['port']
-            user = self._db_conf['user']
-            password = self._db_conf['password']
-            database = self._db_name
-
-            pool = PooledDB(
-                creator=creator,
-                host=host,
-                port=port,
-                user=user,
-                password=password,
-                database=database,
-                autocommit=True,
-                charset='utf8mb4',
-                read_timeout=20,
-                write_timeout=60,
-                maxconnections=100,
-                mincached=3,
-                maxusage=30,
-                blocking=True,
-                cursorclass=pymysql.cursors.DictCursor,
-                ping=7
-            )
-        elif self._mode.lower() == 'redis':
-            host = self._db_conf['host']
-            port = self._db_conf['port']
-            password = self._db_conf['password']
-            database = self._db_name
-
-            pool = redis.ConnectionPool(
-                host=host,
-                port=port,
-                password=password,
-                db=database,
-                max_connections=100,
-                decode_responses=True,
-            )
-        elif self._mode.lower() == 'elasticsearch':
-            host = self._db_conf['host']
-            port = self._db_conf['port']
-            user = self._db_conf['user']
-            password = self._db_conf['password']
-
-            pool = Elasticsearch(
-                hosts=f'http://{host}:{port}',
-                http_auth=(user, password),
-                sniff_on_node_failure=True,
-                sniff_timeout=60,
-            )
-        else:
-            raise Exception(f'mode错误，当前未实现{self._mode}模式')
-        PoolDB.__pools[self.__key] = pool
+        return self.__record.key
+
+    @property
+    def metrics(self) -> PoolMetrics:
+        return self.__record.metrics
+
+    def _prepare(self) -> _PoolRecord:
+        """创建连接池并注册（调用方持有锁）"""
+        db_name = self.__frozen[1]
+        key = hashlib.md5(f'{self._mode}/{db_name}/{self._db_conf}'.encode(encoding='UTF-8')).hexdigest()
+        name = f'{self._db_conf.get("host")}:{self._db_conf.get("port")}/{db_name or ""}' if self._db_conf else ''
+        metrics = PoolMetrics(self._mode, name)
+        pool = _create_pool(self._mode.lower(), db_name, self._db_conf, metrics)
+        metrics.gauges = getattr(pool, 'gauges', None)
+
+        old = PoolDB.__pools.get(self.__frozen)
+        record = _PoolRecord(key, self._mode, db_name, self._db_conf, pool, metrics)
+        PoolDB.__pools[self.__frozen] = record
+        PoolDB.__keys[key] = self.__frozen
+        if old is not None and old.pid == os.getpid():
+            old.close()
+        elif old is not None:
+            PoolDB.__inherited.append(old)
+        return record
 
     def get_connection(self):
+        if self.__record.pid != os.getpid():  # fork后在子进程中使用，重建连接池
+            self.__record = self.__current()
         coon = None
+        pool = self.__record.pool
         if self._mode == 'mysql':
-            coon = self.__pool.connection()
+            coon = pool.connection()
         elif self._mode == 'redis':
-            coon = redis.Redis(connection_pool=self.__pool)
+            coon = redis.Redis(connection_pool=pool)
         elif self._mode == 'mongo':
-            pass
+            coon = pool.connection(self._db_name)
         elif self._mode == 'elasticsearch':
-            coon = self.__pool
+            coon = pool
             if not coon.ping():
-                self._prepare()
-                return self.get_connection()
+                with PoolDB._lock:
+                    record = PoolDB.__pools.get(self.__frozen)
+                    if record is None or record is self.__record:  # 其他线程已重建时直接使用
+                        record = self._prepare()
+                    self.__record = record
+                return record.pool
         return coon
 
     @classmethod
-    def close_pool(cls, key=None):
+    def find_metrics(cls, mode: str, db_name, db_conf):
+        """
+        已创建的连接池的指标，不存在时不创建
+        :return: PoolMetrics，或None
+        """
+        record = cls.__pools.get((mode, _pool_db_name(mode, db_name), _freeze(db_conf)))
+        return record.metrics if record is not None and record.pid == os.getpid() else None
 
-        def close(pool):
-            try:
-                pool.close()
-            except:
-                pass
+    @classmethod
+    def __get_records(cls, key=None) -> list:
+        with cls._lock:
+            if key is None:
+                return list(cls.__pools.values())
+            frozen = cls.__keys.get(key)
+            return [cls.__pools[frozen]] if frozen in cls.__pools else []
 
-        if key:
-            close(cls.__pools.get(key))
-        else:
-            for key in cls.__pools:
-                close(cls.__pools.get(key))
+    @classmethod
+    def list_pools(cls) -> list:
+        """
+        已创建的连接池
+        :return: [{'key': key, 'mode': 类型, 'name': host:port/db, 'options': 连接池参数}]
+        """
+        return [
+            {
+                'key': record.key,
+                'mode': record.mode,
+                'name': record.metrics.name,
+                'options': pool_options(record.mode, record.db_conf),
+            }
+            for record in cls.__get_records()
+        ]
 
+    @classmethod
+    def stats(cls, key=None) -> dict:
+        """
+        连接池指标
+        :param key: 连接池的key，为空则返回所有
+        :return: {key: 指标}
+        """
+        return {record.key: record.metrics.snapshot() for record in cls.__get_records(key)}
 
-def get_coon(mode: str = 'mysql', **kwargs):
+    @classmethod
+    def drain(cls, key=None):
+        """
+        关闭空闲连接，连接池仍可继续使用
+        :param key: 连接池的key，为空则处理所有
+        :return:
+        """
+        for record in cls.__get_records(key):
+            record.drain()
+
+    @classmethod
+    def resize(cls, key, **options):
+        """
+        调整连接池参数：以新参数重建连接池，原连接池的空闲连接立即关闭，已借出的连接归还后随原连接池释放
+        :param key: 连接池的key
+        :param options: 连接池参数，见 MYSQL_POOL_OPTIONS、REDIS_POOL_OPTIONS
+        :return:
+        """
+        with cls._lock:
+            frozen = cls.__keys.get(key)
+            record = cls.__pools.get(frozen)
+            if record is None:
+                raise Exception(f'连接池 {key} 不存在')
+            if record.mode.lower() not in ('mysql', 'redis'):
+                # 原连接池无法只关闭空闲连接（MongoClient关闭后正在使用的库对象也不可用），替换后会遗留连接与监控线程
+                raise Exception(f'{record.mode} 连接池不支持调整参数，请修改db_conf后使用close_pool重建')
+            db_conf = dict(record.db_conf or {})
+            db_conf['pool'] = {**(db_conf.get('pool') or {}), **options}
+            pool_options(record.mode, db_conf)  # 校验参数
+
+            pool = _create_pool(record.mode.lower(), record.db_name, db_conf, record.metrics)
+            record.metrics.gauges = getattr(pool, 'gauges', None)
+            old_pool, record.pool, record.db_conf = record.pool, pool, db_conf
+        _PoolRecord(key, record.mode, record.db_name, db_conf, old_pool, record.metrics).drain()
+
+    @classmethod
+    def close_pool(cls, key=None):
+        """
+        关闭连接池，再次使用时重新创建
+        :param key: 连接池的key，为空则关闭所有
+        :return:
+        """
+        with cls._lock:
+            records = cls.__get_records(key)
+            for record in records:
+                cls.__pools.pop(cls.__keys.pop(record.key, None), None)
+        for record in records:
+            if record.pid == os.getpid():
+                record.close()
+            else:
+                cls.__inherited.append(record)
+
+    @classmethod
+    def _after_fork_in_child(cls):
+        """
+        fork后的子进程：父进程的连接池全部弃用（保留引用，不关闭），使用时重新创建。
+        fork时其他线程可能持有锁，子进程中重建锁
+        """
+        cls._lock = threading.RLock()
+        cls.__inherited.extend(cls.__pools.values())
+        cls.__pools.clear()
+        cls.__keys.clear()
+
+
+def get_pool(mode: str = 'mysql', **kwargs) -> PoolDB:
     """
 
     :param mode: 使用的模式
@@ -143,8 +647,60 @@ def get_coon(mode: str = 'mysql', **kwargs):
     db_name = kwargs.get('db_name', None)
     db_conf = kwargs.get('db_conf', None)
 
-    dbpool = PoolDB(mode, db_name, db_conf)
-    return dbpool.get_connection()
+    return PoolDB(mode, db_name, db_conf)
+
+
+def get_coon(mode: str = 'mysql', **kwargs):
+    """
+
+    :param mode: 使用的模式
+    :param kwargs:
+    :return:
+    """
+    return get_pool(mode, **kwargs).get_connection()
+
+
+def pool_stats(key=None) -> dict:
+    return PoolDB.stats(key=key)
+
+
+_stats_logger = None
+
+
+def start_stats_log(interval: int = 60, *, level: int = logging.INFO):
+    """
+    定时将连接池指标写入日志
+    :param interval: 间隔（秒）
+    :param level: 日志级别
+    :return:
+    """
+    global _stats_logger
+    with PoolDB._lock:
+        if _stats_logger is not None:
+            return _stats_logger
+
+        def run():
+            while True:
+                time.sleep(interval)
+                for key, item in pool_stats().items():
+                    logging.log(level, f'连接池指标 {key}: {json.dumps(item, ensure_ascii=False)}')
+
+        _stats_logger = threading.Thread(target=run, name='pool-stats-log')
+        _stats_logger.daemon = True
+        _stats_logger.start()
+        return _stats_logger
+
+
+def list_pools() -> list:
+    return PoolDB.list_pools()
+
+
+def drain(key=None):
+    return PoolDB.drain(key=key)
+
+
+def resize(key, **options):
+    return PoolDB.resize(key, **options)
 
 
 def close_pool(key=None):
@@ -154,3 +710,43 @@ def close_pool(key=None):
 @atexit.register
 def close_all_pool():
     return close_pool()
+
+
+def _after_fork_in_child():
+    global _stats_logger
+    _stats_logger = None  # 子进程中没有该线程
+    PoolDB._after_fork_in_child()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+if __name__ == '__main__':
+    # 不同连接池参数下的QPS（需可用的MySQL，配置见config）：python -m dao.poolDB
+    from concurrent.futures import ThreadPoolExecutor
+
+    from dao import mysqlDB
+
+    def bench(pool: dict, *, threads: int = 16, times: int = 500):
+        db_conf = {'pool': pool}
+
+        def worker():
+            for _ in range(times):
+                mysqlDB.execute('SELECT 1', db_conf=db_conf)
+
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            for future in [executor.submit(worker) for _ in range(threads)]:
+                future.result()
+        return threads * times / (time.time() - start)
+
+    settings = {
+        'default': {},
+        'max_usage=0': {'max_usage': 0},
+        'ping=1': {'ping': 1},
+        'max_usage=0, ping=0': {'max_usage': 0, 'ping': 0},
+        'max_usage=0, ping=1, max_connections=16': {'max_usage': 0, 'ping': 1, 'max_connections': 16},
+    }
+    for name, pool_setting in settings.items():
+        print(f'{name:<45} {bench(pool_setting):>10.0f} qps')
@@ -0,0 +1,99 @@
+#!-*- coding:utf-8 -*-
+# python3.7
+# CreateTime: 2026/10/18 16:20
+# FileName: 连接池监控指标
+
+import bisect
+import threading
+from typing import Callable
+
+
+class Histogram:
+    """
+    耗时分布（秒），按固定区间计数
+    """
+
+    bounds = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def snapshot(self) -> dict:
+        buckets = {f'<={int(bound * 1000)}ms': count for bound, count in zip(self.bounds, self.counts)}
+        buckets[f'>{int(self.bounds[-1] * 1000)}ms'] = self.counts[-1]
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total / self.count * 1000, 3) if self.count else 0,
+            'max_ms': round(self.max * 1000, 3),
+            'buckets': buckets,
+        }
+
+
+class PoolMetrics:
+    """
+    单个连接池的指标：连接的创建与关闭、获取连接的等待时间与超时、失败、查询耗时
+    """
+
+    counters = ('created', 'closed', 'acquired', 'acquire_timeouts', 'acquire_errors', 'query_errors')
+    latency_alpha = 0.2  # 近期查询耗时的平滑系数
+
+    def __init__(self, mode: str, name: str = '', gauges: Callable[[], dict] = None):
+        """
+
+        :param mode: 连接池类型
+        :param name: 连接池描述（host:port/db）
+        :param gauges: 获取实时数据的方法，返回 {'checked_out': 已借出, 'idle': 空闲, 'max_connections': 最大连接数}
+        """
+        self.mode = mode
+        self.name = name
+        self.gauges = gauges
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self.counters, 0)
+        self._wait = Histogram()
+        self._query = Histogram()
+        self.latency = 0.0  # 近期查询耗时（秒，指数移动平均），为0表示还没有查询
+
+    def incr(self, counter: str, value: int = 1):
+        with self._lock:
+            self._counts[counter] += value
+
+    def observe_wait(self, seconds: float):
+        """获取连接的等待时间"""
+        with self._lock:
+            self._counts['acquired'] += 1
+            self._wait.observe(seconds)
+
+    def observe_query(self, seconds: float, *, success: bool = True):
+        """查询耗时"""
+        with self._lock:
+            self._query.observe(seconds)
+            self.latency = seconds if not self.latency else self.latency + (seconds - self.latency) * self.latency_alpha
+            if not success:
+                self._counts['query_errors'] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            result = {
+                'mode': self.mode,
+                'name': self.name,
+                **self._counts,
+                'latency_ms': round(self.latency * 1000, 3),
+                'wait': self._wait.snapshot(),
+                'query': self._query.snapshot(),
+            }
+        if self.gauges is not None:
+            try:
+                result.update(self.gauges())
+            except Exception as e:
+                result['gauges_error'] = str(e)
+        return result
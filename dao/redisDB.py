@@ -2,6 +2,7 @@
 # python3.7
 # CreateTime: 2022/10/27 16:54
 # FileName:
+import time
 from typing import Union
 
 from dao import poolDB, db, config, db_exception
@@ -16,8 +17,11 @@ class Redis:
     default_db = 0
 
     def __init__(self, db_name, db_conf, *, use_pool) -> None:
+        self.__metrics = None
         if use_pool:
-            self.__conn = poolDB.get_coon(mode='redis', db_name=db_name, db_conf=db_conf)
+            pool = poolDB.get_pool(mode='redis', db_name=db_name, db_conf=db_conf)
+            self.__conn = pool.get_connection()
+            self.__metrics = pool.metrics
         else:
             self.__conn = db.Db('redis', db_name, db_conf)
 
@@ -29,6 +33,7 @@ class Redis:
         raise_error = kwargs.pop('raise_error') if 'raise_error' in kwargs else True  # 是否扔出异常
 
         res = {'result': None, 'success': True}
+        start = time.time()
         with self.__conn as coon:
             try:
                 result = getattr(coon, action)(*args, **kwargs)
@@ -38,6 +43,9 @@ class Redis:
                 res['success'] = False
                 if raise_error:
                     raise db_exception.DbException(e)
+            finally:
+                if self.__metrics is not None:
+                    self.__metrics.observe_query(time.time() - start, success=res['success'])
 
         return res
 
@@ -52,7 +60,7 @@ def redis_obj(db_name: Union[int, str] = Redis.default_db, *, db_conf: dict = No
     """
     db_name = config.REDIS_DB.get(db_name, db_name)
 
-    db_config = Redis.default_conf
+    db_config = dict(Redis.default_conf)
     if db_conf is not None:
         db_config.update(db_conf)
 
@@ -0,0 +1,286 @@
+#!-*- coding:utf-8 -*-
+# python3.7
+# CreateTime: 2026/10/18 23:40
+# FileName: 慢查询记录
+
+"""
+记录mysqlDB.execute()中超过阈值的语句，按语句结构（参数、IN的数量等替换后的sql）汇总，
+可在首次出现时执行EXPLAIN，标记全表扫描、文件排序、临时表。默认关闭，通过enable()开启：
+
+    slow_query.enable(0.2)
+    ...
+    stats = slow_query.snapshot(reset=True)  # 定时导出
+"""
+
+import functools
+import hashlib
+import logging
+import re
+import threading
+import time
+from typing import Optional
+
+from dao.pool_metrics import Histogram
+
+SLOW_THRESHOLD = 0.5  # 慢查询的阈值（秒）
+MAX_SHAPES = 1000  # 最多记录的语句结构数量，超出后新的结构只计数
+SAMPLE_LENGTH = 1000  # 示例语句的最大长度
+EXPLAIN_PREFIXES = ('SELECT', 'UPDATE', 'DELETE', 'INSERT', 'REPLACE')  # 可以EXPLAIN的语句
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"")
+_NUMBER = re.compile(r'(?<![\w`.])-?\d+(?:\.\d+)?(?:e[+-]?\d+)?\b', re.I)
+_VALUE_LIST = r'\(\s*\?(?:\s*,\s*\?)*\s*\)'
+_IN_LIST = re.compile(r'\bIN\s*' + _VALUE_LIST, re.I)
+_ROWS = re.compile(f'{_VALUE_LIST}(?:\\s*,\\s*{_VALUE_LIST})+')
+_SPACE = re.compile(r'\s+')
+
+
+@functools.lru_cache(maxsize=4096)
+def normalize(sql: str) -> str:
+    """
+    语句结构：字符串、数字、占位符替换为?，IN的值与多行VALUES合并，空白合并。
+    sql_builder生成的语句只有IN的数量、行数不同的会归为一类
+    :param sql:
+    :return:
+    """
+    sql = _STRING.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    sql = _ROWS.sub(lambda m: m.group(0)[:m.group(0).index(')') + 1] + ',...', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def digest(shape: str) -> str:
+    return hashlib.md5(shape.encode()).hexdigest()[:16]
+
+
+def plan_flags(plan: list) -> list:
+    """
+    EXPLAIN结果中需要关注的问题
+    :param plan: EXPLAIN的结果行
+    :return: full_scan（type为ALL）、full_index_scan（type为index）、filesort、temporary
+    """
+    flags = []
+    for row in plan:
+        access = (row.get('type') or '').upper()
+        extra = row.get('Extra') or ''
+        if access == 'ALL' and 'full_scan' not in flags:
+            flags.append('full_scan')
+        if access == 'INDEX' and 'full_index_scan' not in flags:
+            flags.append('full_index_scan')
+        if 'Using filesort' in extra and 'filesort' not in flags:
+            flags.append('filesort')
+        if 'Using temporary' in extra and 'temporary' not in flags:
+            flags.append('temporary')
+    return flags
+
+
+class _ShapeStats:
+
+    def __init__(self, shape: str):
+        self.shape = shape
+        self.digest = digest(shape)
+        self.histogram = Histogram()
+        self.first_seen = self.last_seen = time.time()
+        self.sample = ''
+        self.plan = None
+        self.flags = []
+        self.explain_error = ''
+
+    def snapshot(self) -> dict:
+        histogram = self.histogram.snapshot()
+        return {
+            'digest': self.digest,
+            'shape': self.shape,
+            'count': histogram['count'],
+            'total_ms': round(self.histogram.total * 1000, 3),
+            'avg_ms': histogram['avg_ms'],
+            'max_ms': histogram['max_ms'],
+            'buckets': histogram['buckets'],
+            'first_seen': self.first_seen,
+            'last_seen': self.last_seen,
+            'sample': self.sample,
+            'flags': list(self.flags),
+            'plan': self.plan,
+            'explain_error': self.explain_error,
+        }
+
+
+class SlowQueryLog:
+    """
+    慢查询记录，按语句结构汇总次数、耗时分布、最慢一次的示例语句与执行计划
+    """
+
+    def __init__(
+            self,
+            threshold: float = SLOW_THRESHOLD,
+            *,
+            explain: bool = True,
+            sample: bool = True,
+            max_shapes: int = MAX_SHAPES,
+    ):
+        """
+
+        :param threshold: 阈值（秒），耗时不低于该值的语句被记录
+        :param explain: 语句结构首次出现时，是否在同一连接中执行EXPLAIN
+        :param sample: 是否保存填充参数后的示例语句（可能包含敏感数据）
+        :param max_shapes: 最多记录的语句结构数量
+        """
+        self.threshold = threshold
+        self.explain = explain
+        self.sample = sample
+        self.max_shapes = max_shapes
+        self._lock = threading.Lock()
+        self._shapes = {}
+        self._dropped = 0  # 超出max_shapes未记录的次数
+
+    def observe(self, sql: str, args, seconds: float, *, cursor=None):
+        """
+        记录一次执行，低于阈值时直接返回
+        :param sql: 执行的语句
+        :param args: 参数
+        :param seconds: 耗时
+        :param cursor: 执行该语句的连接上的新游标，用于生成示例语句与EXPLAIN，由调用方关闭
+        :return:
+        """
+        if seconds < self.threshold:
+            return
+        shape = normalize(sql)
+        with self._lock:
+            stats = self._shapes.get(shape)
+            if stats is None:
+                if len(self._shapes) >= self.max_shapes:
+                    self._dropped += 1
+                    return
+                stats = self._shapes[shape] = _ShapeStats(shape)
+                need_explain = self.explain and cursor is not None
+            else:
+                need_explain = False
+            slowest = seconds > stats.histogram.max
+            stats.histogram.observe(seconds)
+            stats.last_seen = time.time()
+
+        logging.warning(f'慢查询 {seconds * 1000:.1f}ms [{stats.digest}]: {shape[:SAMPLE_LENGTH]}')
+        if args and isinstance(args[0], (list, tuple)):
+            args = args[0]  # executemany只取第一组参数
+        # 示例语句与EXPLAIN需要访问数据库，在锁外执行，结果在锁内写入
+        sample = None
+        if self.sample and slowest and cursor is not None:
+            try:
+                sample = cursor.mogrify(sql, args)[:SAMPLE_LENGTH]
+            except Exception:
+                sample = sql[:SAMPLE_LENGTH]
+        explained = self.__explain(cursor, sql, args) if need_explain else None
+        with self._lock:
+            if sample is not None and seconds >= stats.histogram.max:  # 期间有更慢的一次时保留其示例
+                stats.sample = sample
+            if explained is not None:
+                stats.plan, stats.flags, stats.explain_error = explained
+        if explained is not None and explained[1]:
+            logging.warning(f'慢查询 [{stats.digest}] 执行计划: {", ".join(explained[1])}')
+
+    @staticmethod
+    def __explain(cursor, sql: str, args):
+        """
+        :return: (执行计划, 问题, 错误信息)，不能EXPLAIN的语句为None
+        """
+        if not sql.lstrip()[:7].upper().startswith(EXPLAIN_PREFIXES):
+            return None
+        try:
+            cursor.execute(f'EXPLAIN {sql}', args)
+            rows = cursor.fetchall()
+            if rows and not isinstance(rows[0], dict):
+                names = [column[0] for column in cursor.description]
+                rows = [dict(zip(names, row)) for row in rows]
+            plan = [dict(row) for row in rows]
+        except Exception as e:
+            return None, [], str(e)
+        return plan, plan_flags(plan), ''
+
+    def snapshot(self, *, reset: bool = False) -> dict:
+        """
+        各语句结构的汇总，按总耗时倒序
+        :param reset: 是否清空（定时导出时使用）
+        :return: {'threshold_ms': 阈值, 'dropped': 未记录的次数, 'shapes': [...]}
+        """
+        with self._lock:
+            shapes = [stats.snapshot() for stats in self._shapes.values()]
+            dropped = self._dropped
+            if reset:
+                self._shapes = {}
+                self._dropped = 0
+        shapes.sort(key=lambda item: item['total_ms'], reverse=True)
+        return {'threshold_ms': round(self.threshold * 1000, 3), 'dropped': dropped, 'shapes': shapes}
+
+
+_slow_log = None  # type: Optional[SlowQueryLog]
+
+
+def enable(threshold: float = SLOW_THRESHOLD, **kwargs) -> SlowQueryLog:
+    """
+    开启慢查询记录（替换已有的记录）
+    :param threshold: 阈值（秒）
+    :param kwargs: explain、sample、max_shapes，见SlowQueryLog
+    :return:
+    """
+    global _slow_log
+    _slow_log = SlowQueryLog(threshold, **kwargs)
+    return _slow_log
+
+
+def disable():
+    global _slow_log
+    _slow_log = None
+
+
+def current() -> Optional[SlowQueryLog]:
+    """开启时为当前的记录，否则为None"""
+    return _slow_log
+
+
+def snapshot(*, reset: bool = False) -> dict:
+    """见SlowQueryLog.snapshot()，未开启时为空"""
+    if _slow_log is None:
+        return {'threshold_ms': None, 'dropped': 0, 'shapes': []}
+    return _slow_log.snapshot(reset=reset)
+
+
+if __name__ == '__main__':
+    # 语句结构：python -m dao.slow_query
+    for tmp_sql in (
+            "SELECT * FROM `user` WHERE `id` IN (1, 2, 3) AND `name` = 'a''b' LIMIT 10",
+            'SELECT `a`,`b` FROM `t1` WHERE `a` IN (%s,%s,%s) AND `b`>=%s LIMIT 20',
+            'INSERT INTO `t` (`id`,`a`) VALUES (%s,%s),(%s,%s),(%s,%s) ON DUPLICATE KEY UPDATE `a`=VALUES(`a`)',
+            "UPDATE t2 SET score = 1.5e3, name = \"x\" WHERE id = -3",
+    ):
+        print(normalize(tmp_sql))
+    print(plan_flags([{'type': 'ALL', 'Extra': 'Using where; Using filesort'}, {'type': 'ref', 'Extra': None}]))
+
+    # 多线程记录同一结构：次数完整，示例为最慢的一次，EXPLAIN只执行一次
+    from concurrent.futures import ThreadPoolExecutor
+
+    class FakeCursor:
+        explains = 0
+
+        def mogrify(self, sql, args):
+            return sql % tuple(args)
+
+        def execute(self, sql, args=None):
+            FakeCursor.explains += 1
+
+        def fetchall(self):
+            return [{'id': 1, 'type': 'ALL', 'Extra': 'Using where'}]
+
+    tmp_log = SlowQueryLog(0.1)
+    logging.disable(logging.WARNING)  # 不输出1000条慢查询日志
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for i in range(1000):
+            executor.submit(tmp_log.observe, 'SELECT * FROM `user` WHERE `id` = %s', [i], 0.1 + i / 1000,
+                            cursor=FakeCursor())
+    logging.disable(logging.NOTSET)
+    tmp_stats = tmp_log.snapshot()['shapes'][0]
+    assert tmp_stats['count'] == 1000, tmp_stats['count']
+    assert tmp_stats['sample'] == 'SELECT * FROM `user` WHERE `id` = 999', tmp_stats['sample']
+    assert tmp_stats['flags'] == ['full_scan'] and FakeCursor.explains == 1, (tmp_stats['flags'], FakeCursor.explains)
+    print('concurrent observe ok')
@@ -3,12 +3,52 @@
 # Create time: 2022/10/12 11:00
 # Filename:
 
-from typing import Tuple, List
+import functools
+from typing import Tuple, List, Optional, Iterable, Iterator, TYPE_CHECKING
 
-from pypika import MySQLQuery, Table, CustomFunction, Order
-from pypika import functions as fn
-from pypika.queries import QueryBuilder
-from pypika.terms import Values
+from pymysql.converters import escape_item
+
+from dao import sql_render
+
+if TYPE_CHECKING:
+    from pypika import Table
+    from pypika.queries import QueryBuilder
+
+QUERY_CACHE_SIZE = 1024  # 缓存的语句结构数量
+CONDITION_OPS = ('=', '>', '>=', '<', '<=', '!=', '<>', 'IS NULL', 'IS NOT NULL', 'LIKE', 'IN', 'NOT IN', 'BETWEEN')
+
+IN_CHUNK_SIZE = 1000  # IN的值超过该数量时，分为多条语句查询
+IN_TABLE_SIZE = 50000  # IN的值超过该数量时（NOT IN、有统计分组排序分页时超过IN_CHUNK_SIZE），写入临时表
+UPSERT_CHUNK_SIZE = 1000  # 每条多行插入语句的最大行数
+UPSERT_MAX_BYTES = 1024 * 1024  # 每条多行插入语句的最大字节数（估算，含语句），需明显小于服务端的max_allowed_packet（5.7默认4M）
+
+# 生成sql的方式。pypika：通过pypika生成（用到时才导入）；fast：直接拼接字符串（sql_render），结果与pypika一致
+RENDERERS = ('pypika', 'fast')
+DEFAULT_RENDERER = 'pypika'
+
+
+def set_renderer(name: str):
+    """
+    设置全局的生成方式，各gen_*函数的renderer参数为None时使用
+    :param name: RENDERERS之一
+    :return:
+    """
+    global DEFAULT_RENDERER
+    DEFAULT_RENDERER = _renderer(name)
+
+
+def _renderer(name: str = None) -> str:
+    name = name or DEFAULT_RENDERER
+    if name not in RENDERERS:
+        raise Exception(f'{name} 生成方式暂不支持，可选：{RENDERERS}')
+    return name
+
+
+class InTable(str):
+    """
+    IN、NOT IN的值为临时表（单列 `v`）中的数据，生成 `字段` IN (SELECT `v` FROM `临时表`)，不占用参数。
+    用法：{'id': {'in': InTable('_in_ids')}}
+    """
 
 
 def gen_wheres_part(table_name: str, conditions: dict, args: list = None):
@@ -48,6 +88,8 @@ def gen_wheres_part(table_name: str, conditions: dict, args: list = None):
                 where_strs.append(f"{table_str}{field} like %s")
                 condition_op_value = f'%{condition_op_value}%'
                 match = True
+            elif op in ('IN', 'NOT IN') and isinstance(condition_op_value, InTable):
+                where_strs.append(f"{table_str}{field} {op} (SELECT `v` FROM `{condition_op_value}`)")
             elif op == 'IN':
                 condition_value_len = len(condition_op_value)
                 if condition_value_len == 0:
@@ -79,7 +121,7 @@ def gen_wheres_part(table_name: str, conditions: dict, args: list = None):
     return ' AND '.join(where_strs), where_value_list
 
 
-def gen_wheres(table: Table, q: QueryBuilder, conditions: dict, args: list = None):
+def gen_wheres(table: 'Table', q: 'QueryBuilder', conditions: dict, args: list = None):
     """
     :param table:
     :param q:
@@ -128,6 +170,12 @@ def gen_wheres(table: Table, q: QueryBuilder, conditions: dict, args: list = Non
                 q = q.where(table[field].like('%s'))
                 condition_op_value = f'%{condition_op_value}%'
                 match = True
+            elif op in ('IN', 'NOT IN') and isinstance(condition_op_value, InTable):
+                from pypika import MySQLQuery, Table
+
+                in_table = Table(condition_op_value)
+                sub_query = MySQLQuery.from_(in_table).select(in_table.v)
+                q = q.where(table[field].isin(sub_query) if op == 'IN' else table[field].notin(sub_query))
             elif op == 'IN':
                 condition_value_len = len(condition_op_value)
                 q = q.where(table[field].isin(['%s'] * condition_value_len))
@@ -151,11 +199,101 @@ def gen_wheres(table: Table, q: QueryBuilder, conditions: dict, args: list = Non
     return q, where_value_list
 
 
+def condition_shape(conditions: dict, args: list = None) -> Tuple[tuple, List]:
+    """
+    查询条件的结构与值。结构相同的条件生成的sql相同，值与gen_wheres()的顺序一致
+    :param conditions: 见gen_wheres()用法
+    :param args: 条件之前的值
+    :return: (结构 ((字段, 操作, 值的数量或InTable), ...), 值)
+    """
+    values = list(args) if args is not None else []
+    shape = []
+    for field, condition_value in (conditions or {}).items():
+        for op, condition_op_value in condition_value.items():
+            op = op.upper()
+            if op not in CONDITION_OPS:
+                raise Exception(f'{op} 模式暂不支持')
+            if op in ('IS NULL', 'IS NOT NULL'):
+                shape.append((field, op, None))
+                continue
+            if isinstance(condition_op_value, InTable):
+                shape.append((field, op, condition_op_value))
+                continue
+            if op == 'LIKE':
+                condition_op_value = f'%{condition_op_value}%'
+            # 与gen_wheres()一致，IN、BETWEEN取值的长度
+            shape.append((field, op, len(condition_op_value) if op in ('IN', 'NOT IN', 'BETWEEN') else None))
+            if isinstance(condition_op_value, (list, set)):
+                values.extend(condition_op_value)
+            else:
+                values.append(condition_op_value)
+    return tuple(shape), values
+
+
+def _shape_condition(shape: tuple) -> dict:
+    """由结构还原查询条件（值为占位），用于生成sql"""
+    conditions = {}
+    for field, op, length in shape:
+        if isinstance(length, InTable):
+            conditions.setdefault(field, {})[op] = length
+        else:
+            conditions.setdefault(field, {})[op] = [None] * length if length is not None else None
+    return conditions
+
+
+def large_in(condition: dict, size: int = IN_CHUNK_SIZE) -> Optional[Tuple[str, str, list]]:
+    """
+    条件中值的数量超过size的IN、NOT IN，有多个时取值最多的一个
+    :param condition: 见gen_wheres()用法
+    :param size:
+    :return: (字段, 操作（条件中原本的写法）, 值)，没有则为None
+    """
+    found = None
+    for field, condition_value in (condition or {}).items():
+        for op, condition_op_value in condition_value.items():
+            if op.upper() not in ('IN', 'NOT IN') or isinstance(condition_op_value, InTable):
+                continue
+            if len(condition_op_value) > size and (found is None or len(condition_op_value) > len(found[2])):
+                found = (field, op, list(condition_op_value))
+    return found
+
+
+def replace_in(condition: dict, field: str, op: str, value) -> dict:
+    """替换条件中一个IN的值，不修改原条件"""
+    condition = dict(condition)
+    condition[field] = {**condition[field], op: value}
+    return condition
+
+
+def split_in(condition: dict, field: str, op: str, chunk_size: int = IN_CHUNK_SIZE):
+    """
+    将IN的值（去重后）分为多份，每份一个条件，各条件的查询结果合并即为原条件的结果。
+    NOT IN不能拆分
+    :param condition: 见gen_wheres()用法
+    :param field: 字段
+    :param op: 操作（条件中原本的写法）
+    :param chunk_size: 每份的数量
+    :return: 生成器
+    """
+    values = list(dict.fromkeys(condition[field][op]))
+    for start in range(0, len(values), chunk_size):
+        yield replace_in(condition, field, op, values[start: start + chunk_size])
+
+
+def _freeze_items(items) -> tuple:
+    if not items:
+        return ()
+    if isinstance(items, dict):
+        return tuple(items.items())
+    return tuple(tuple(item) if isinstance(item, list) else item for item in items)
+
+
 def gen_select_sql(table_name: str, cols: list, condition: dict = None,
                    sum_item: dict = None, count_item: dict = None, group_by: list = None, order_by: list = None,
-                   limit: int = None, offset: int = None):
+                   limit: int = None, offset: int = None, *, renderer: str = None):
     """
-
+    结构相同（表、字段、条件的字段与操作、IN的数量、分组排序、是否有limit等）的查询只生成一次sql，之后只取出值。
+    limit、offset作为参数传入，不同的分页共用一条sql；条件中有InTable（临时表名每次不同）时不使用缓存
     :param table_name: 表名
     :param cols: 需要查询的字段，不包含统计字段
     :param condition: 查询条件，见gen_wheres()用法
@@ -165,8 +303,63 @@ def gen_select_sql(table_name: str, cols: list, condition: dict = None,
     :param order_by: 排序字段。[(字段, 排序方法（DESC）)]
     :param limit: 查询条数
     :param offset:
+    :param renderer: 生成方式，见RENDERERS，默认为DEFAULT_RENDERER
+    :return: sql与值
+    """
+    shape, args = condition_shape(condition)
+    if limit:
+        args.append(limit)
+    if offset:
+        args.append(offset)
+    sql = _sql_cache(_cached_select_sql, shape)(
+        table_name, tuple(cols), shape, _freeze_items(sum_item), _freeze_items(count_item),
+        _freeze_items(group_by), _freeze_items(order_by), '%s' if limit else None, '%s' if offset else None,
+        _renderer(renderer),
+    )
+    return sql, args
+
+
+def _sql_cache(cached_func, shape: tuple):
+    """条件中有InTable时不使用缓存，避免临时表名占满缓存"""
+    if any(isinstance(length, InTable) for _, _, length in shape):
+        return cached_func.__wrapped__
+    return cached_func
+
+
+@functools.lru_cache(maxsize=QUERY_CACHE_SIZE)
+def _cached_select_sql(table_name, cols, shape, sum_item, count_item, group_by, order_by, limit, offset,
+                       renderer) -> str:
+    if renderer == 'fast':
+        return sql_render.select_sql(
+            table_name, cols, shape, sum_item, count_item, group_by, order_by, limit, offset,
+        )
+    sql, _ = build_select_sql(
+        table_name, list(cols), _shape_condition(shape), dict(sum_item), dict(count_item),
+        list(group_by), list(order_by), limit, offset,
+    )
+    return sql
+
+
+def build_select_sql(table_name: str, cols: list, condition: dict = None,
+                     sum_item: dict = None, count_item: dict = None, group_by: list = None, order_by: list = None,
+                     limit: int = None, offset: int = None):
+    """
+    通过pypika生成查询语句（不使用缓存）
+
+    :param table_name: 表名
+    :param cols: 需要查询的字段，不包含统计字段
+    :param condition: 查询条件，见gen_wheres()用法
+    :param sum_item: 需要求和的字段。{字段: 字段别名}
+    :param count_item: 需要统计数量的字段。{字段: 字段别名}
+    :param group_by: 需分组的字段
+    :param order_by: 排序字段。[(字段, 排序方法（DESC）)]
+    :param limit: 查询条数，作为参数传入
+    :param offset: 作为参数传入
     :return: sql与值
     """
+    from pypika import MySQLQuery, Table, Order
+    from pypika import functions as fn
+
     table = Table(table_name)
 
     # 查询的字段
@@ -209,22 +402,55 @@ def gen_select_sql(table_name: str, cols: list, condition: dict = None,
             q = q.orderby(order[0], order=o)
 
     if limit:
-        q = q.limit(limit)
+        q = q.limit('%s')
+        where_value_list_all.append(limit)
     if offset:
-        q = q.offset(offset)  # 分页步长
+        q = q.offset('%s')  # 分页步长
+        where_value_list_all.append(offset)
 
     sql = q.get_sql().replace('\'%s\'', '%s')
     return sql, where_value_list_all
 
 
-def gen_insert_sql(table_name: str, row: dict, update_cols: list = None) -> Tuple[str, List]:
+def gen_key_range_sql(table_name: str, key: str, condition: dict = None, *, renderer: str = None):
+    """
+    字段的最小值与最大值
+    :param table_name: 表名
+    :param key: 字段（一般为主键）
+    :param condition: 查询条件，见gen_wheres()用法
+    :param renderer: 生成方式，见RENDERERS
+    :return: sql与值。结果字段为 min_key、max_key
+    """
+    if _renderer(renderer) == 'fast':
+        shape, args = condition_shape(condition)
+        return sql_render.key_range_sql(table_name, key, shape), args
+
+    from pypika import MySQLQuery, Table
+    from pypika import functions as fn
+
+    table = Table(table_name)
+    q = MySQLQuery.from_(table).select(fn.Min(table[key]).as_('min_key'), fn.Max(table[key]).as_('max_key'))
+    q, args = gen_wheres(table, q, condition)
+    sql = q.get_sql().replace('\'%s\'', '%s')
+    return sql, args
+
+
+def gen_insert_sql(table_name: str, row: dict, update_cols: list = None, *,
+                   renderer: str = None) -> Tuple[str, List]:
     """
     插入语句
     :param table_name: 表名
     :param row: 单行数据
     :param update_cols: 主键相同时，需要更新的字段
+    :param renderer: 生成方式，见RENDERERS
     :return: 一条sql语句
     """
+    if _renderer(renderer) == 'fast':
+        return sql_render.insert_sql(table_name, tuple(row), 1, tuple(update_cols or ())), list(row.values())
+
+    from pypika import MySQLQuery, Table
+    from pypika.terms import Values
+
     table = Table(table_name)
 
     cols, values, str_list = [], [], []
@@ -246,14 +472,23 @@ def gen_insert_sql(table_name: str, row: dict, update_cols: list = None) -> Tupl
     return sql, values
 
 
-def gen_insert_sqls(table_name: str, rows: list, update_cols: list = None):
+def gen_insert_sqls(table_name: str, rows: list, update_cols: list = None, *, renderer: str = None):
     """
     插入语句
     :param table_name: 表名
-    :param rows: 需要插入的多行数据
+    :param rows: 需要插入的多行数据，字段以第一行为准。字段不同、数量很多时使用gen_upsert_sqls()
     :param update_cols: 主键相同时，需要更新的字段
+    :param renderer: 生成方式，见RENDERERS
     :return: 一条sql语句，及对应的值
     """
+    if _renderer(renderer) == 'fast':
+        all_cols = tuple(rows[0]) if rows else ()
+        values = [row[col] for row in rows for col in all_cols]
+        return sql_render.insert_sql(table_name, all_cols, len(rows), tuple(update_cols or ())), values
+
+    from pypika import MySQLQuery, Table
+    from pypika.terms import Values
+
     table = Table(table_name)
 
     all_cols, values, all_args = [], [], []     # 键、所有的值、所有的%s
@@ -288,7 +523,131 @@ def gen_insert_sqls(table_name: str, rows: list, update_cols: list = None):
     return sql, values
 
 
-def gen_update_sql(table_name, cols: dict, conditions: dict):
+def gen_upsert_sqls(
+        table_name: str,
+        rows: Iterable[dict],
+        update_cols: list = None,
+        *,
+        chunk_size: int = UPSERT_CHUNK_SIZE,
+        max_bytes: int = UPSERT_MAX_BYTES,
+        keep_order: bool = False,
+        renderer: str = None,
+) -> Iterator[dict]:
+    """
+    多行插入（INSERT ... ON DUPLICATE KEY UPDATE），逐行读取，按字段集合分组，
+    每组按行数与字节数分为多条语句，生成器逐条返回，可直接作为mysqlDB.execute_many()的参数
+    :param table_name: 表名
+    :param rows: 多行数据（可为生成器），各行的字段可以不同
+    :param update_cols: 主键相同时需要更新的字段，每组只取该组中有的字段（没有则为普通INSERT）。为None时更新该组的全部字段
+    :param chunk_size: 每条语句的最大行数
+    :param max_bytes: 每条语句填充参数后的最大字节数（按pymysql的转义与utf8编码计算），单行超出时单独一条
+    :param keep_order: 是否保持行的顺序：字段集合变化时先返回之前的行。
+        为False时各组分别累积，字段不同的行可能先于之前的行写入（同一主键的多次写入顺序可能改变）
+    :param renderer: 生成方式，见RENDERERS
+    :return: 生成器，每次返回 {'sql': sql, 'args': 值}
+    """
+    renderer = _renderer(renderer)
+    groups = {}  # 字段集合: [字段, 行的值, 字节数]
+
+    def group_update_cols(key, cols) -> tuple:
+        return cols if update_cols is None else tuple(col for col in update_cols if col in key)
+
+    def statement_size(key, cols) -> int:
+        """VALUES中各行以外的部分的字节数"""
+        sql = _cached_insert_sql(table_name, cols, 1, group_update_cols(key, cols), renderer)
+        return len(sql.encode('utf8')) - len(cols) * 3
+
+    def flush(key):
+        cols, values, _ = groups.pop(key)
+        sql = _cached_insert_sql(table_name, cols, len(values) // len(cols), group_update_cols(key, cols), renderer)
+        return {'sql': sql, 'args': values}
+
+    last_key = None
+    for row in rows:
+        key = frozenset(row)
+        if not key:
+            continue
+        if keep_order and last_key is not None and key != last_key and last_key in groups:
+            yield flush(last_key)
+        last_key = key
+
+        group = groups.get(key)
+        if group is None:
+            cols = tuple(row)
+            group = groups[key] = [cols, [], statement_size(key, cols)]
+        cols, values, size = group
+        row_size = 3 + sum(_arg_size(row[col]) for col in cols)  # 括号、逗号与各值
+        if values and (len(values) // len(cols) >= chunk_size or size + row_size > max_bytes):
+            yield flush(key)
+            group = groups[key] = [cols, [], statement_size(key, cols)]
+            values = group[1]
+        values.extend(row[col] for col in cols)
+        group[2] += row_size
+
+    for key in list(groups):
+        yield flush(key)
+
+
+def _arg_size(value) -> int:
+    """参数按pymysql的转义填充到sql后的字节数（含分隔的逗号）"""
+    escaped = escape_item(value, 'utf8mb4')
+    size = len(escaped.encode('utf8', 'surrogateescape')) + 1
+    if isinstance(value, (bytes, bytearray)):
+        size += len('_binary')  # pymysql的连接转义bytes时另加前缀
+    return size
+
+
+@functools.lru_cache(maxsize=QUERY_CACHE_SIZE)
+def _cached_insert_sql(table_name, cols, rows, update_cols, renderer) -> str:
+    if renderer == 'fast':
+        return sql_render.insert_sql(table_name, cols, rows, update_cols)
+    sql, _ = gen_insert_sqls(table_name, [dict.fromkeys(cols)] * rows, list(update_cols), renderer='pypika')
+    return sql
+
+
+def gen_bulk_insert_parts(table_name: str, cols: list, update_cols: list = None, *,
+                          renderer: str = None) -> Tuple[str, str, str]:
+    """
+    分批插入的语句结构，VALUES后的多行数据由调用方拼接
+    :param table_name: 表名
+    :param cols: 插入的字段
+    :param update_cols: 主键相同时，需要更新的字段
+    :param renderer: 生成方式，见RENDERERS
+    :return: (VALUES之前的部分, 单行的占位符, VALUES之后的部分)。sql = 前缀 + ','.join(多行) + 后缀
+    """
+    if _renderer(renderer) == 'fast':
+        return sql_render.insert_parts(table_name, tuple(cols), tuple(update_cols or ()))
+
+    placeholder = f"({','.join(['%s'] * len(cols))})"
+    sql, _ = gen_insert_sqls(table_name, [dict.fromkeys(cols)], update_cols, renderer='pypika')
+    prefix, suffix = sql.split(placeholder, 1)
+    return prefix, placeholder, suffix
+
+
+def gen_update_sql(table_name, cols: dict, conditions: dict, *, renderer: str = None):
+    """
+    更新语句，结构相同时只生成一次sql
+    :param table_name: 表名
+    :param cols: 更新的字段。{字段: 值}
+    :param conditions: 条件，见gen_wheres()用法
+    :param renderer: 生成方式，见RENDERERS
+    :return: sql与值
+    """
+    shape, args = condition_shape(conditions, list(cols.values()))
+    return _sql_cache(_cached_update_sql, shape)(table_name, tuple(cols), shape, _renderer(renderer)), args
+
+
+@functools.lru_cache(maxsize=QUERY_CACHE_SIZE)
+def _cached_update_sql(table_name, cols, shape, renderer) -> str:
+    if renderer == 'fast':
+        return sql_render.update_sql(table_name, cols, shape)
+    sql, _ = build_update_sql(table_name, dict.fromkeys(cols), _shape_condition(shape))
+    return sql
+
+
+def build_update_sql(table_name, cols: dict, conditions: dict):
+    from pypika import MySQLQuery, Table
+
     table = Table(table_name)
 
     q = MySQLQuery.update(table)
@@ -303,7 +662,29 @@ def gen_update_sql(table_name, cols: dict, conditions: dict):
     return sql, args
 
 
-def gen_delete_sql(table_name, conditions: dict):
+def gen_delete_sql(table_name, conditions: dict, *, renderer: str = None):
+    """
+    删除语句，结构相同时只生成一次sql
+    :param table_name: 表名
+    :param conditions: 条件，见gen_wheres()用法
+    :param renderer: 生成方式，见RENDERERS
+    :return: sql与值
+    """
+    shape, args = condition_shape(conditions)
+    return _sql_cache(_cached_delete_sql, shape)(table_name, shape, _renderer(renderer)), args
+
+
+@functools.lru_cache(maxsize=QUERY_CACHE_SIZE)
+def _cached_delete_sql(table_name, shape, renderer) -> str:
+    if renderer == 'fast':
+        return sql_render.delete_sql(table_name, shape)
+    sql, _ = build_delete_sql(table_name, _shape_condition(shape))
+    return sql
+
+
+def build_delete_sql(table_name, conditions: dict):
+    from pypika import MySQLQuery, Table
+
     table = Table(table_name)
 
     q = MySQLQuery.from_(table)
@@ -311,3 +692,159 @@ def gen_delete_sql(table_name, conditions: dict):
     q, args = gen_wheres(table, q, conditions)
     sql = q.delete().get_sql().replace('\'%s\'', '%s')
     return sql, args
+
+
+if __name__ == '__main__':
+    # 校验fast与pypika生成的sql一致，并对比生成sql的耗时：python -m dao.sql_builder
+    import random
+    import time
+
+    def random_condition() -> dict:
+        condition = {}
+        for field in random.sample(['id', 'name', 'age', 'city', 'deleted_at'], random.randint(0, 4)):
+            ops = random.sample(CONDITION_OPS, random.randint(1, 3))
+            items = {}
+            for op in ops:
+                if op in ('IN', 'NOT IN'):
+                    items[op.lower()] = random.choice([list, tuple, set, lambda _: InTable('_in_ids')])(
+                        range(random.randint(0, 5)))
+                elif op == 'BETWEEN':
+                    items[op] = [1, 9]
+                else:
+                    items[random.choice([op, op.lower()])] = random.choice([1, 'x', None])
+            condition[field] = items
+        return condition
+
+    def random_cols(k: int = 4) -> list:
+        return random.sample(['id', 'name', 'age', 'city', 'score', '%*'], random.randint(0, k))
+
+    def random_case():
+        kind = random.choice(['select', 'update', 'delete', 'insert', 'insert_many', 'key_range', 'bulk_parts'])
+        table_name = random.choice(['user', 'order_item', 'db.t'])
+        if kind == 'select':
+            return kind, (gen_select_sql, build_select_sql), (table_name, random_cols(), random_condition()), dict(
+                sum_item={col: random.choice([None, f's_{col}']) for col in random_cols(2) if col != '%*'},
+                count_item={col: random.choice([None, f'n_{col}']) for col in random_cols(2) if col != '%*'},
+                group_by=[col for col in random_cols(2) if col != '%*'],
+                order_by=random.choice([None, [(col, random.choice(['desc', 'ASC', 'x'])) for col in ['id', 'age']]]),
+                limit=random.choice([None, 0, 20]), offset=random.choice([None, 0, 40]),
+            )
+        if kind == 'update':
+            cols = {col: 1 for col in random_cols() if col != '%*'} or {'name': 'x'}
+            return kind, (gen_update_sql, build_update_sql), (table_name, cols, random_condition()), {}
+        if kind == 'delete':
+            return kind, (gen_delete_sql, build_delete_sql), (table_name, random_condition()), {}
+        update_cols = random.choice([None, ['name'], ['name', 'age']])
+        cols = [col for col in random_cols() if col != '%*'] or ['id']
+        if kind == 'insert':
+            return kind, (gen_insert_sql, None), (table_name, dict.fromkeys(cols, 1), update_cols), {}
+        if kind == 'insert_many':
+            rows = [dict.fromkeys(cols, i) for i in range(random.randint(0, 4))]
+            return kind, (gen_insert_sqls, None), (table_name, rows, update_cols), {}
+        if kind == 'key_range':
+            return kind, (gen_key_range_sql, None), (table_name, 'id', random_condition()), {}
+        return kind, (gen_bulk_insert_parts, None), (table_name, cols, update_cols), {}
+
+    # 结果一致性：fast、pypika（缓存）、pypika（不缓存）
+    random.seed(22)
+    checked = 0
+    for _ in range(5000):
+        kind, (gen, build), case_args, case_kwargs = random_case()
+        expect = gen(*case_args, **case_kwargs, renderer='pypika')
+        assert gen(*case_args, **case_kwargs, renderer='fast') == expect, f'{kind} 结果不一致: {case_args} {case_kwargs}'
+        if build is not None:
+            assert build(*case_args, **case_kwargs) == expect, f'{kind} 缓存结果不一致: {case_args} {case_kwargs}'
+        checked += 1
+    print(f'parity ok: {checked} cases')
+
+    # 分页、临时表名不同的查询不应占用新的缓存
+    _cached_select_sql.cache_clear()
+    for page in range(1, 51):
+        page_sql, page_args = gen_select_sql('user', ['id'], {'age': {'>': 1}}, limit=20, offset=page * 20)
+        assert page_sql.endswith('LIMIT %s OFFSET %s') and page_args == [1, 20, page * 20], (page_sql, page_args)
+        gen_select_sql('user', ['id'], {'id': {'in': InTable(f'_in_{page}')}})
+    assert _cached_select_sql.cache_info().currsize == 1, _cached_select_sql.cache_info()
+    print('select cache ok: 50 pages and 50 temporary tables -> 1 entry')
+
+    cases = [
+        ('select', gen_select_sql, lambda gen, **kwargs: gen(
+            'user', ['id', 'name'], {'age': {'>=': 18, '<': 60}, 'city': {'in': ['a', 'b', 'c']}, 'name': {'like': 'x'}},
+            order_by=[('id', 'desc')], limit=20, offset=40, **kwargs,
+        )),
+        ('update', gen_update_sql, lambda gen, **kwargs: gen(
+            'user', {'name': 'test', 'age': 20}, {'id': {'=': 1}}, **kwargs,
+        )),
+        ('delete', gen_delete_sql, lambda gen, **kwargs: gen(
+            'user', {'id': {'in': [1, 2, 3]}, 'deleted_at': {'is not null': None}}, **kwargs,
+        )),
+        ('insert', gen_insert_sqls, lambda gen, **kwargs: gen(
+            'user', [{'id': i, 'name': 'test', 'age': 20} for i in range(10)], ['name', 'age'], **kwargs,
+        )),
+    ]
+    builders = {
+        'select': build_select_sql,
+        'update': build_update_sql,
+        'delete': build_delete_sql,
+        'insert': functools.partial(gen_insert_sqls, renderer='pypika'),
+    }
+    caches = (_cached_select_sql, _cached_update_sql, _cached_delete_sql)
+
+    def uncached(gen, *args, **kwargs):
+        for item in caches:
+            item.cache_clear()
+        return gen(*args, **kwargs)
+
+    times = 5000
+    for name, gen, case in cases:
+        runs = [
+            ('pypika', lambda: case(builders[name])),
+            ('fast', lambda: case(functools.partial(uncached, gen), renderer='fast')),
+            ('pypika+cache', lambda: case(gen, renderer='pypika')),
+            ('fast+cache', lambda: case(gen, renderer='fast')),
+        ]
+        line = []
+        for label, run in runs:
+            start = time.time()
+            for _ in range(times):
+                run()
+            line.append(f'{label} {(time.time() - start) / times * 1e6:>7.2f}us')
+        print(f'{name:<8}', '   '.join(line))
+
+    # 10万行、多种字段集合的多行插入：逐条生成语句的耗时，并校验占位符与值的数量一致
+    upsert_rows = [
+        {'id': i, 'name': f'name_{i}', **({'age': i % 100} if i % 3 else {}), **({'city': 'x'} if i % 5 == 0 else {})}
+        for i in range(100000)
+    ]
+    for name in RENDERERS:
+        start = time.time()
+        statements = 0
+        for item in gen_upsert_sqls('user', iter(upsert_rows), ['name', 'age'], renderer=name):
+            assert item['sql'].count('%s') == len(item['args'])
+            statements += 1
+        print(f'upsert   {name:<6} {len(upsert_rows)} rows -> {statements} statements   {(time.time() - start) * 1000:>7.1f} ms')
+
+    # 需要转义的值：按pymysql的转义填充参数后，每条语句都不超过max_bytes
+    import datetime
+    import decimal
+    tricky_rows = [
+        {
+            'id': i,
+            'name': "it's \\ \"q\"\n中文" * 20,
+            'blob': b"\x00'\xff\\" * 30,
+            'at': datetime.datetime(2020, 1, 1, 1, 1, 1),
+            'day': datetime.date(2020, 1, 1),
+            'price': decimal.Decimal('1.50'),
+            'memo': None,
+        }
+        for i in range(5000)
+    ]
+    tricky_max = 100000
+    largest = 0
+    for item in gen_upsert_sqls('user', iter(tricky_rows), ['name'], max_bytes=tricky_max):
+        filled = item['sql'] % tuple(
+            ('_binary' if isinstance(v, bytes) else '') + escape_item(v, 'utf8mb4') for v in item['args']
+        )
+        size = len(filled.encode('utf8', 'surrogateescape'))
+        assert size <= tricky_max, size
+        largest = max(largest, size)
+    print(f'upsert escaped values: largest statement {largest} <= {tricky_max} bytes')
@@ -0,0 +1,127 @@
+#!-*- coding:utf-8 -*-
+# python3.7
+# CreateTime: 2026/10/18 22:10
+# FileName: 直接拼接的sql生成（不依赖pypika）
+
+"""
+sql_builder的另一种生成方式，结果与pypika（MySQLQuery）生成的sql逐字节相同，
+输入为sql_builder.condition_shape()得到的条件结构，值均为占位符%s
+"""
+
+from typing import Tuple
+
+
+def quote(name) -> str:
+    return f'`{name}`'
+
+
+def _placeholders(count: int) -> str:
+    return ','.join(['%s'] * count)
+
+
+_COMPARE_OPS = {'=': '=', '>': '>', '>=': '>=', '<': '<', '<=': '<=', '!=': '<>', '<>': '<>'}
+
+
+def where_sql(shape: tuple) -> str:
+    """
+    :param shape: 条件结构 ((字段, 操作, IN的数量或临时表名), ...)
+    :return: ' WHERE ...'，无条件时为空
+    """
+    if not shape:
+        return ''
+    parts = []
+    for field, op, length in shape:
+        field = quote(field)
+        if op in _COMPARE_OPS:
+            parts.append(f'{field}{_COMPARE_OPS[op]}%s')
+        elif op == 'IS NULL':
+            parts.append(f'{field} IS NULL')
+        elif op == 'IS NOT NULL':
+            parts.append(f'{field} IS NOT NULL')
+        elif op == 'LIKE':
+            parts.append(f'{field} LIKE %s')
+        elif op in ('IN', 'NOT IN') and isinstance(length, str):
+            parts.append(f'{field} {op} (SELECT `v` FROM {quote(length)})')
+        elif op == 'IN':
+            parts.append(f'{field} IN ({_placeholders(length)})')
+        elif op == 'NOT IN':
+            parts.append(f'{field} NOT IN ({_placeholders(length)})')
+        elif op == 'BETWEEN':
+            parts.append(f'{field} BETWEEN %s AND %s')
+        else:
+            raise Exception(f'{op} 模式暂不支持')
+    return ' WHERE ' + ' AND '.join(parts)
+
+
+def _alias(term: str, alias) -> str:
+    return f'{term} {quote(alias)}' if alias is not None else term
+
+
+def select_sql(
+        table_name: str, cols: tuple, shape: tuple,
+        sum_item: tuple = (), count_item: tuple = (), group_by: tuple = (), order_by: tuple = (),
+        limit: str = None, offset: str = None,
+) -> str:
+    """
+    参数见 sql_builder.gen_select_sql，sum_item、count_item为 ((字段, 别名), ...)，limit、offset为占位符%s或None
+    """
+    selects = ['*'] if '%*' in cols else [quote(col) for col in cols]
+    selects.extend(_alias(f'SUM({quote(key)})', alias) for key, alias in sum_item)
+    selects.extend(_alias(f'COUNT({quote(key)})', alias) for key, alias in count_item)
+    if not selects:
+        return ''
+
+    sql = f'SELECT {",".join(selects)} FROM {quote(table_name)}{where_sql(shape)}'
+    if group_by:
+        sql += ' GROUP BY ' + ','.join(quote(item) for item in group_by)
+    if order_by:
+        sql += ' ORDER BY ' + ','.join(
+            f'{quote(order[0])} {"DESC" if order[1].upper() == "DESC" else "ASC"}' for order in order_by
+        )
+    if limit:
+        sql += f' LIMIT {limit}'
+    if offset:
+        sql += f' OFFSET {offset}'
+    return sql
+
+
+def key_range_sql(table_name: str, key: str, shape: tuple) -> str:
+    key = quote(key)
+    return f'SELECT MIN({key}) `min_key`,MAX({key}) `max_key` FROM {quote(table_name)}{where_sql(shape)}'
+
+
+def insert_sql(table_name: str, cols: tuple, rows: int, update_cols: tuple = ()) -> str:
+    """
+    :param table_name: 表名
+    :param cols: 插入的字段
+    :param rows: 行数
+    :param update_cols: 主键相同时，需要更新的字段
+    :return:
+    """
+    if not rows:
+        return ''
+    sql = f'INSERT INTO {quote(table_name)}'
+    if cols:
+        sql += f' ({",".join(quote(col) for col in cols)})'
+    sql += ' VALUES ' + ','.join([f'({_placeholders(len(cols))})'] * rows)
+    if update_cols:
+        sql += ' ON DUPLICATE KEY UPDATE ' + ','.join(f'{quote(col)}=VALUES({quote(col)})' for col in update_cols)
+    return sql
+
+
+def insert_parts(table_name: str, cols: tuple, update_cols: tuple = ()) -> Tuple[str, str, str]:
+    """见 sql_builder.gen_bulk_insert_parts"""
+    placeholder = f'({_placeholders(len(cols))})'
+    prefix, suffix = insert_sql(table_name, cols, 1, update_cols).split(placeholder, 1)
+    return prefix, placeholder, suffix
+
+
+def update_sql(table_name: str, cols: tuple, shape: tuple) -> str:
+    if not cols:
+        return ''
+    sets = ','.join(f'{quote(col)}=%s' for col in cols)
+    return f'UPDATE {quote(table_name)} SET {sets}{where_sql(shape)}'
+
+
+def delete_sql(table_name: str, shape: tuple) -> str:
+    return f'DELETE FROM {quote(table_name)}{where_sql(shape)}'
@@ -0,0 +1,244 @@
+#!-*- coding:utf-8 -*-
+# python3.7
+# CreateTime: 2026/10/18 14:05
+# FileName: 二级缓存（进程内缓存 + Redis）
+
+import json
+import logging
+import threading
+import uuid
+from typing import Union, List, Dict
+
+from dao import redisDB, db_exception
+from utils import cache, thread_func, DataEncoder
+
+INVALIDATE_CHANNEL = 'tiered_cache:invalidate'
+
+
+class TieredCache:
+    """
+    二级缓存：先查进程内的utils.cache（L1），未命中再查Redis（L2）并回填L1。
+    写入、删除时通过Redis发布订阅通知其他节点清除L1
+    """
+
+    def __init__(
+            self,
+            prefix: str = '',
+            *,
+            db_name: Union[int, str] = redisDB.Redis.default_db,
+            db_conf: dict = None,
+            l1_expire: int = 60,
+            write_behind: bool = False,
+            channel: str = INVALIDATE_CHANNEL,
+            raise_error: bool = True,
+    ):
+        """
+
+        :param prefix: key前缀
+        :param db_name: Redis库名。int 或 config中已有的命名定义
+        :param db_conf: Redis配置。格式参考 redisDB.Redis.default_conf
+        :param l1_expire: L1的最长有效时间（秒），避免丢失失效通知时长期读到旧值
+        :param write_behind: 是否异步写Redis（先写L1，后台批量写入Redis）
+        :param channel: 失效通知的频道
+        :param raise_error: Redis异常时是否扔出异常，否则视为未命中
+        """
+        self.prefix = prefix
+        self.l1_expire = l1_expire
+        self.write_behind = write_behind
+        self.channel = channel
+        self.raise_error = raise_error
+        self.node_id = uuid.uuid4().hex  # 忽略自己发出的失效通知
+
+        self.__redis = redisDB.redis_obj(db_name, db_conf=db_conf, use_pool=True).coon
+        self.__pending = {}  # 待写入Redis的数据。key: (序列化后的值, expire)
+        self.__pending_lock = threading.Lock()
+        self.__flush_lock = threading.Lock()  # 删除时等待正在进行的异步写入，避免已删除的key被写回
+        self.__writer = thread_func.ThreadQueue(f'tiered-cache-writer-{self.node_id[:8]}') if write_behind else None
+        self.__subscriber = None
+
+    def __key(self, key: str) -> str:
+        return f'{self.prefix}{key}'
+
+    def __l1_expire(self, expire: int = None):
+        return min(expire, self.l1_expire) if expire and self.l1_expire else (expire or self.l1_expire)
+
+    @staticmethod
+    def dumps(value) -> str:
+        return json.dumps(value, cls=DataEncoder.ObjEncoder)
+
+    @staticmethod
+    def loads(value: str):
+        return json.loads(value)
+
+    def __handle_error(self, action: str, e: Exception):
+        logging.error(f'二级缓存 {action} 失败: {e}')
+        if self.raise_error:
+            raise db_exception.DbException(e)
+
+    def get(self, key: str):
+        full_key = self.__key(key)
+        value = cache.get(full_key)
+        if value is not None:
+            return value
+
+        try:
+            raw = self.__redis.get(full_key)
+        except Exception as e:
+            self.__handle_error('get', e)
+            return None
+        if raw is None:
+            return None
+        value = self.loads(raw)
+        cache.set(full_key, value, expire=self.__l1_expire())
+        return value
+
+    def get_many(self, keys: List[str]) -> Dict[str, object]:
+        """
+        批量获取，L1未命中的key通过一次mget从Redis获取
+        :param keys:
+        :return: {key: value}，不存在的key不返回
+        """
+        result, missing = {}, []
+        for key in keys:
+            value = cache.get(self.__key(key))
+            if value is None:
+                missing.append(key)
+            else:
+                result[key] = value
+        if not missing:
+            return result
+
+        try:
+            raws = self.__redis.mget([self.__key(key) for key in missing])
+        except Exception as e:
+            self.__handle_error('get_many', e)
+            return result
+        for key, raw in zip(missing, raws):
+            if raw is None:
+                continue
+            value = self.loads(raw)
+            cache.set(self.__key(key), value, expire=self.__l1_expire())
+            result[key] = value
+        return result
+
+    def set(self, key: str, value, *, expire: int = None):
+        """
+
+        :param key:
+        :param value:
+        :param expire: 失效时间（秒）
+        :return:
+        """
+        return self.set_many({key: value}, expire=expire)
+
+    def set_many(self, mapping: Dict[str, object], *, expire: int = None):
+        """
+        批量写入，Redis使用pipeline一次提交。
+        L1中保存序列化再反序列化后的值，与从Redis读取的值一致（tuple为list、datetime为str等），也不与调用方共用对象
+        :param mapping: {key: value}
+        :param expire: 失效时间（秒）
+        :return:
+        """
+        raws = {self.__key(key): self.dumps(value) for key, value in mapping.items()}
+        for full_key, raw in raws.items():
+            cache.set(full_key, self.loads(raw), expire=self.__l1_expire(expire))
+
+        if self.write_behind:
+            with self.__pending_lock:
+                schedule = not self.__pending
+                for full_key, raw in raws.items():
+                    self.__pending[full_key] = (raw, expire)
+            if schedule:
+                thread_func.submit(self.__writer, self.flush)
+            return True
+
+        return self.__write({full_key: (raw, expire) for full_key, raw in raws.items()})
+
+    def __write(self, items: dict) -> bool:
+        """
+        :param items: {完整的key: (序列化后的值, 失效时间)}
+        """
+        try:
+            with self.__redis.pipeline(transaction=False) as pipe:
+                for full_key, (raw, expire) in items.items():
+                    pipe.set(full_key, raw, ex=expire)
+                pipe.publish(self.channel, json.dumps({'node': self.node_id, 'keys': list(items)}))  # 其他节点的L1失效
+                pipe.execute()
+        except Exception as e:
+            self.__handle_error('set', e)
+            return False
+        return True
+
+    def flush(self):
+        """异步写入模式下，将待写入的数据提交至Redis"""
+        with self.__flush_lock:
+            with self.__pending_lock:
+                items, self.__pending = self.__pending, {}
+            if items:
+                self.__write(items)
+
+    def delete(self, key: str) -> bool:
+        return self.delete_many([key]) > 0
+
+    def delete_many(self, keys: List[str]) -> int:
+        """
+        删除，并通知其他节点清除L1
+        :param keys:
+        :return: Redis中删除的数量
+        """
+        if not keys:
+            return 0
+        full_keys = [self.__key(key) for key in keys]
+        with self.__flush_lock:  # 已取出待写入数据的flush完成后再删除
+            with self.__pending_lock:
+                for full_key in full_keys:
+                    self.__pending.pop(full_key, None)
+            for full_key in full_keys:
+                cache.delete(full_key)
+
+            try:
+                with self.__redis.pipeline(transaction=False) as pipe:
+                    pipe.delete(*full_keys)
+                    pipe.publish(self.channel, json.dumps({'node': self.node_id, 'keys': full_keys}))
+                    deleted, _ = pipe.execute()
+            except Exception as e:
+                self.__handle_error('delete', e)
+                return 0
+        return deleted
+
+    def subscribe(self):
+        """启动订阅线程，接收其他节点的失效通知并清除L1"""
+        if self.__subscriber is not None:
+            return self.__subscriber
+
+        pubsub = self.__redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{self.channel: self.__on_invalidate})
+        self.__subscriber = pubsub.run_in_thread(sleep_time=1, daemon=True)
+        return self.__subscriber
+
+    def __on_invalidate(self, message):
+        try:
+            data = json.loads(message['data'])
+        except Exception as e:
+            logging.error(f'二级缓存 失效通知解析失败: {e}')
+            return
+        if data.get('node') == self.node_id:
+            return
+        for full_key in data.get('keys', []):
+            cache.delete(full_key)
+
+    def close(self):
+        if self.write_behind:
+            self.flush()
+        if self.__subscriber is not None:
+            self.__subscriber.stop()
+            self.__subscriber = None
+
+
+if __name__ == '__main__':
+    # tiered = TieredCache('demo:', db_name=14, l1_expire=30)
+    # tiered.subscribe()
+    # tiered.set_many({'a': 1, 'b': {'name': 'test'}}, expire=300)
+    # print(tiered.get('a'), tiered.get_many(['a', 'b', 'c']))
+    # tiered.delete('a')
+    ...
@@ -3,15 +3,262 @@
 # CreateTime: 2023/8/9 10:21
 # FileName: 全局缓存
 
+import atexit
+import heapq
+import itertools
+import logging
+import mmap
+import os
+import pickle
+import tempfile
 import threading
 import time
+import weakref
 
-from utils import util
+from utils import util, cache_policy
+
+SHARDS = 16  # 默认分片数量
+SNAPSHOT_VERSION = 1  # 快照格式版本
+
+_INF = float('inf')
+
+
+class _Reaper:
+    """
+    过期清理线程：所有带失效时间的key共用一个线程，按最早失效时间（最小堆）依次清理
+    """
+    _instances = weakref.WeakSet()  # fork后在子进程中重置
+
+    def __init__(self, callback):
+        """
+
+        :param callback: 到期回调。callback(key, expire)
+        """
+        self._callback = callback
+        self._cond = threading.Condition(threading.Lock())
+        self._heap = []  # [(expire, seq, key)]
+        self._deadlines = {}  # key: 当前有效的失效时间，堆中与之不一致的为过期的旧记录
+        self._seq = itertools.count()  # 失效时间相同时的排序依据，避免比较key
+        self._running = False
+        _Reaper._instances.add(self)
+
+    def _start(self):
+        """启动线程（调用方持有锁）"""
+        self._running = True
+        thread = threading.Thread(target=self.run, name='cache-reaper')
+        thread.daemon = True  # 避免阻塞主线程的退出
+        thread.start()
+
+    def push(self, key, expire: float):
+        with self._cond:
+            if not self._running:  # 首次使用失效时间时才启动线程
+                self._start()
+            head = self._heap[0][0] if self._heap else _INF
+            self._deadlines[key] = expire
+            heapq.heappush(self._heap, (expire, next(self._seq), key))
+            if len(self._heap) > 2 * len(self._deadlines) + 64:  # 重复set的旧记录过多时，重建堆
+                self._compact()
+            if expire < head:  # 最早失效时间提前，唤醒线程重新计算等待时间
+                self._cond.notify()
+
+    def discard(self, key):
+        with self._cond:
+            self._deadlines.pop(key, None)
+
+    def clear(self):
+        with self._cond:
+            self._deadlines.clear()
+            self._heap.clear()
+
+    def _compact(self):
+        self._heap = [(expire, next(self._seq), key) for key, expire in self._deadlines.items()]
+        heapq.heapify(self._heap)
+
+    def run(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                expire, _, key = self._heap[0]
+                delay = expire - time.time()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                heapq.heappop(self._heap)
+                if self._deadlines.get(key) != expire:  # 已被重新set或delete
+                    continue
+                del self._deadlines[key]
+            self._callback(key, expire)
+
+    def _after_fork_in_child(self):
+        """
+        子进程中没有清理线程，fork时锁可能正被其他线程持有：重建锁，有待清理的key时重新启动线程
+        """
+        self._cond = threading.Condition(threading.Lock())
+        self._running = False
+        if self._deadlines:
+            with self._cond:
+                self._start()
+
+    @classmethod
+    def after_fork_in_child(cls):
+        for reaper in list(cls._instances):
+            reaper._after_fork_in_child()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_Reaper.after_fork_in_child)
+
+
+class _Shard:
+    """
+    缓存分片：独立的数据、锁、淘汰策略及统计
+    """
+
+    def __init__(self, reaper: _Reaper):
+        self.lock = threading.Lock()
+        self.data = {}
+        self.reaper = reaper
+        self.policy = None
+        self.max_entries = None
+        self.max_bytes = None
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.flights = {}  # get_or_set正在计算的key: threading.Event
+
+    def configure(self, policy, max_entries, max_bytes, sizeof):
+        with self.lock:
+            self.policy = policy
+            self.max_entries = max_entries
+            self.max_bytes = max_bytes
+            self.bytes = 0
+            for key, item in self.data.items():
+                item['size'] = sizeof(key, item['value']) if max_bytes else 0
+                self.bytes += item['size']
+                if policy is not None:
+                    policy.insert(key)
+            self._evict()
+
+    def _evict(self):
+        """超出容量时淘汰（调用方持有锁）"""
+        if self.policy is None:
+            return
+        while self.data and (
+                (self.max_entries and len(self.data) > self.max_entries)
+                or (self.max_bytes and self.bytes > self.max_bytes)
+        ):
+            key = self.policy.evict()
+            item = self.data.pop(key)
+            self.bytes -= item['size']
+            self.evictions += 1
+            self.reaper.discard(key)
+
+    def _remove(self, key):
+        """删除key（调用方持有锁）"""
+        item = self.data.pop(key)
+        self.bytes -= item['size']
+        if self.policy is not None:
+            self.policy.remove(key)
+        return item
+
+    def set(self, key, value, deadline: float, size: int):
+        with self.lock:
+            self._set(key, value, deadline, size)
+
+    def set_many(self, items: list):
+        """items: [(key, value, deadline, size)]"""
+        with self.lock:
+            for key, value, deadline, size in items:
+                self._set(key, value, deadline, size)
+
+    def _set(self, key, value, deadline: float, size: int):
+        """写入（调用方持有锁）"""
+        old = self.data.get(key)
+        self.data[key] = {
+            'value': value,
+            'expire': deadline,
+            'size': size,
+        }
+        self.bytes += size - (old['size'] if old is not None else 0)
+        if self.policy is not None:
+            if old is None:
+                self.policy.insert(key)
+            else:
+                self.policy.record(key)
+        # 重复set时，新的失效时间覆盖原有记录
+        if deadline != _INF:
+            self.reaper.push(key, deadline)
+        elif old is not None and old['expire'] != _INF:
+            self.reaper.discard(key)
+        if self.policy is not None:
+            self._evict()
+
+    def get(self, key):
+        with self.lock:
+            return self._get(key, time.time())
+
+    def get_many(self, keys: list, result: dict):
+        """命中的key写入result"""
+        now = time.time()
+        with self.lock:
+            for key in keys:
+                value = self._get(key, now)
+                if value is not None:
+                    result[key] = value
+
+    def _get(self, key, now: float):
+        """读取（调用方持有锁）"""
+        item = self.data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        if now < item['expire']:
+            self.hits += 1
+            if self.policy is not None:
+                self.policy.record(key)
+            return item['value']
+        self._remove(key)  # 惰性失效：清理线程未及时处理时，读取时删除
+        self.misses += 1
+        return None
+
+    def exist(self, key) -> bool:
+        with self.lock:
+            item = self.data.get(key)
+            return item is not None and time.time() < item['expire']
+
+    def delete(self, key) -> bool:
+        with self.lock:
+            return self._delete(key)
+
+    def delete_many(self, keys: list) -> int:
+        count = 0
+        with self.lock:
+            for key in keys:
+                if self._delete(key):
+                    count += 1
+        return count
+
+    def _delete(self, key) -> bool:
+        """删除（调用方持有锁）"""
+        if key in self.data:
+            self._remove(key)
+            self.reaper.discard(key)
+            return True
+        return False
+
+    def expire(self, key, expire: float):
+        with self.lock:
+            item = self.data.get(key)
+            if item is not None and item['expire'] == expire:
+                self._remove(key)
 
 
 class Cache:
     """
-    全局缓存，可定时失效
+    全局缓存，可定时失效。可限制容量（条数、字节数），超出时按淘汰策略（lru、lfu、tinylfu）淘汰。
+    数据按key的hash分散到多个分片，各分片独立加锁，不同key的并发读写互不阻塞
     """
     __lock = threading.Lock()
     instance = None
@@ -27,58 +274,324 @@ class Cache:
                 cls.instance = super(Cache, cls).__new__(cls)
             return cls.instance
 
-    def __init__(self):
-        self.__data = {}
+    def __init__(
+            self, *,
+            max_entries: int = None, max_bytes: int = None, policy: str = 'lru', sizeof=None,
+            shards: int = SHARDS,
+    ):
+        """
+
+        :param max_entries: 最大条数
+        :param max_bytes: 最大字节数（估算）
+        :param policy: 淘汰策略。lru、lfu、tinylfu
+        :param sizeof: 计算单条缓存字节数的方法。sizeof(key, value)
+        :param shards: 分片数量
+        """
+        if getattr(self, '_Cache__shards', None) is not None:  # 单例只初始化一次，修改配置使用configure
+            return
+        self.__reaper = _Reaper(self.__expire)
+        self.__shards = [_Shard(self.__reaper)]
+        self.__sizeof = None
+        self.__max_entries = None
+        self.__max_bytes = None
+        self.__snapshot = None  # 定时快照线程
+        self.__dump_lock = threading.Lock()  # 定时保存与退出时保存不同时写文件
+        self.configure(max_entries=max_entries, max_bytes=max_bytes, policy=policy, sizeof=sizeof, shards=shards)
 
     @property
     def data(self):
-        return self.__data
+        """所有分片数据的合并副本"""
+        data = {}
+        for shard in self.__shards:
+            with shard.lock:
+                data.update(shard.data)
+        return data
+
+    def configure(
+            self, *,
+            max_entries: int = None, max_bytes: int = None, policy: str = 'lru', sizeof=None,
+            shards: int = SHARDS,
+    ):
+        """
+        修改容量及分片配置，已有缓存超出容量时立即淘汰。
+        分片数量变化时会重新分配数据，期间并发写入的数据可能丢失，应在启动时调整
+        :param max_entries: 最大条数（平均分配到各分片）
+        :param max_bytes: 最大字节数（估算，平均分配到各分片）
+        :param policy: 淘汰策略。lru、lfu、tinylfu
+        :param sizeof: 计算单条缓存字节数的方法。sizeof(key, value)
+        :param shards: 分片数量
+        :return:
+        """
+        shards = max(int(shards), 1)
+        sizeof = sizeof or (lambda k, v: cache_policy.sizeof(k) + cache_policy.sizeof(v))
+        shard_entries = -(-max_entries // shards) if max_entries else None
+        shard_bytes = -(-max_bytes // shards) if max_bytes else None
+        bounded = bool(max_entries or max_bytes)
+        cache_policy.get_policy(policy)  # 提前校验策略名称
+
+        with Cache.__lock:
+            old_shards = self.__shards
+            if shards != len(old_shards):  # 分片数量变化时，重新分配数据
+                new_shards = [_Shard(self.__reaper) for _ in range(shards)]
+                for shard in old_shards:
+                    with shard.lock:
+                        for key, item in shard.data.items():
+                            new_shards[hash(key) % shards].data[key] = item
+                        shard.data = {}
+                self.__shards = new_shards
+
+            self.__sizeof = sizeof if max_bytes else None
+            self.__max_entries = max_entries
+            self.__max_bytes = max_bytes
+            for shard in self.__shards:
+                shard_policy = cache_policy.get_policy(policy, max_entries=shard_entries) if bounded else None
+                shard.configure(shard_policy, shard_entries, shard_bytes, sizeof)
+
+    def stats(self) -> dict:
+        """
+        命中、未命中、淘汰次数及当前容量
+        :return:
+        """
+        result = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'entries': 0,
+            'bytes': 0,
+            'max_entries': self.__max_entries,
+            'max_bytes': self.__max_bytes,
+            'shards': len(self.__shards),
+        }
+        for shard in self.__shards:
+            with shard.lock:
+                result['hits'] += shard.hits
+                result['misses'] += shard.misses
+                result['evictions'] += shard.evictions
+                result['entries'] += len(shard.data)
+                result['bytes'] += shard.bytes
+        return result
+
+    def __shard(self, key) -> _Shard:
+        shards = self.__shards
+        return shards[hash(key) % len(shards)]
+
+    def __group(self, keys) -> dict:
+        """按分片分组。{分片: [key]}"""
+        shards = self.__shards
+        groups = {}
+        for key in keys:
+            groups.setdefault(shards[hash(key) % len(shards)], []).append(key)
+        return groups
+
+    @staticmethod
+    def __deadline(expire: int = None, expire_at: float = None) -> float:
+        if expire_at:
+            return expire_at
+        return time.time() + expire if expire else _INF
 
-    def set(self, key: str, value, *, expire: int = None):
+    def set(self, key: str, value, *, expire: int = None, expire_at: float = None):
         """
 
         :param key:
         :param value:
         :param expire: 失效时间（秒）
+        :param expire_at: 失效时间点（时间戳），优先于expire
         :return:
         """
-        with Cache.__lock:
-            # TODO: set重复key时，停止原线程
-            self.__data[key] = {
-                'value': value,
-                'expire': time.time() + expire if expire else float('inf')
-            }
-
-            if expire:  # 另起一个删除缓存的线程
-                t = threading.Thread(target=self.__expire, args=(key, expire))
-                t.daemon = True  # 避免阻塞主线程的退出
-                t.start()
+        deadline = self.__deadline(expire, expire_at)
+        sizeof = self.__sizeof
+        size = sizeof(key, value) if sizeof is not None else 0
+        self.__shard(key).set(key, value, deadline, size)
+        return True
+
+    def set_many(self, mapping: dict, *, expire: int = None, expire_at: float = None):
+        """
+        批量写入，每个分片只加锁一次
+        :param mapping: {key: value}
+        :param expire: 失效时间（秒）
+        :param expire_at: 失效时间点（时间戳），优先于expire
+        :return:
+        """
+        deadline = self.__deadline(expire, expire_at)
+        sizeof = self.__sizeof
+        shards = self.__shards
+        groups = {}
+        for key, value in mapping.items():
+            size = sizeof(key, value) if sizeof is not None else 0
+            groups.setdefault(shards[hash(key) % len(shards)], []).append((key, value, deadline, size))
+        for shard, items in groups.items():
+            shard.set_many(items)
         return True
 
     def get(self, key: str):
-        with Cache.__lock:
-            if key in self.__data and time.time() < self.__data[key]['expire']:
-                return self.__data[key]['value']
-            return None
+        return self.__shard(key).get(key)
+
+    def get_many(self, keys: list) -> dict:
+        """
+        批量读取，每个分片只加锁一次
+        :param keys:
+        :return: {key: value}，未命中的key不返回
+        """
+        result = {}
+        for shard, shard_keys in self.__group(keys).items():
+            shard.get_many(shard_keys, result)
+        return result
+
+    def get_or_set(self, key: str, factory, *, expire: int = None, expire_at: float = None):
+        """
+        读取，未命中时调用factory生成并写入。同一个key并发未命中时只调用一次factory
+        :param key:
+        :param factory: 生成值的方法，无参数。返回None时不缓存
+        :param expire: 失效时间（秒）
+        :param expire_at: 失效时间点（时间戳），优先于expire
+        :return:
+        """
+        shard = self.__shard(key)
+        while True:
+            with shard.lock:
+                value = shard._get(key, time.time())
+                if value is not None:
+                    return value
+                flight = shard.flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = shard.flights[key] = threading.Event()
+            if leader:
+                break
+            flight.wait()  # 等待其他线程生成后重新读取
+
+        try:
+            value = factory()
+            if value is not None:
+                self.set(key, value, expire=expire, expire_at=expire_at)
+            return value
+        finally:
+            with shard.lock:
+                shard.flights.pop(key, None)
+            flight.set()
 
     def exist(self, key: str) -> bool:
-        with Cache.__lock:
-            return key in self.__data
+        return self.__shard(key).exist(key)
+
+    def __expire(self, key, expire: float):
+        self.__shard(key).expire(key, expire)
+
+    def delete(self, key: str) -> bool:
+        return self.__shard(key).delete(key)
+
+    def delete_many(self, keys: list) -> int:
+        """
+        批量删除，每个分片只加锁一次
+        :param keys:
+        :return: 删除的数量
+        """
+        return sum(shard.delete_many(shard_keys) for shard, shard_keys in self.__group(keys).items())
+
+    def dump(self, path: str) -> int:
+        """
+        保存快照（含失效时间）。先写临时文件（每次单独的文件名）再替换，避免读到写了一半的文件
+        :param path: 快照文件路径
+        :return: 保存的条数
+        """
+        now = time.time()
+        entries = []
+        for key, item in self.data.items():
+            if item['expire'] <= now:
+                continue
+            try:
+                entries.append((key, item['expire'], pickle.dumps(item['value'], protocol=pickle.HIGHEST_PROTOCOL)))
+            except Exception as e:  # 不可序列化的值不保存
+                logging.warning(f'缓存快照跳过 {key}: {e}')
+
+        with self.__dump_lock:
+            fd, tmp_path = tempfile.mkstemp(prefix=f'{os.path.basename(path)}.', suffix='.tmp',
+                                            dir=os.path.dirname(os.path.abspath(path)))
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    pickle.dump({'version': SNAPSHOT_VERSION, 'time': now, 'entries': entries}, f,
+                                protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        return len(entries)
+
+    def load(self, path: str) -> int:
+        """
+        从快照恢复，已失效的数据不恢复。使用mmap读取，不额外复制文件内容。
+        文件无法读取（不完整、格式错误）时视为空快照，单条数据无法恢复（如类已改名）时跳过
+        :param path: 快照文件路径
+        :return: 恢复的条数
+        """
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return 0
+        try:
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                snapshot = pickle.loads(mm)
+            if snapshot.get('version') != SNAPSHOT_VERSION:
+                logging.warning(f'缓存快照版本不一致，忽略：{path}')
+                return 0
+            entries = snapshot['entries']
+        except Exception as e:
+            logging.error(f'缓存快照读取失败，忽略：{path}: {e}')
+            return 0
+
+        now = time.time()
+        sizeof = self.__sizeof
+        count = 0
+        for entry in entries:
+            key = None
+            try:
+                key, deadline, raw = entry
+                if deadline <= now:
+                    continue
+                value = pickle.loads(raw)
+            except Exception as e:
+                logging.warning(f'缓存快照恢复失败 {key}: {e}')
+                continue
+            size = sizeof(key, value) if sizeof is not None else 0
+            self.__shard(key).set(key, value, deadline, size)
+            count += 1
+        return count
 
-    def __del(self, key) -> bool:
+    def start_snapshot(self, path: str, interval: int = 60, *, restore: bool = True):
+        """
+        定时保存快照，进程退出时再保存一次
+        :param path: 快照文件路径
+        :param interval: 保存间隔（秒）
+        :param restore: 启动时是否先从快照恢复
+        :return:
+        """
         with Cache.__lock:
-            if key in self.__data:
-                del self.__data[key]
-                return True
+            if self.__snapshot is not None:
+                return self.__snapshot
+            if restore:
+                self.load(path)
 
-        return False
+            stop = threading.Event()
 
-    def __expire(self, key: str, expire: int):
-        time.sleep(expire)
-        self.__del(key)
+            def run():
+                while not stop.wait(interval):
+                    try:
+                        self.dump(path)
+                    except Exception as e:
+                        logging.error(f'缓存快照保存失败: {e}')
 
-    def delete(self, key: str) -> bool:
-        return self.__del(key)
+            def close():
+                stop.set()
+                t.join()  # 等待正在进行的定时保存结束
+                try:
+                    self.dump(path)
+                except Exception as e:
+                    logging.error(f'缓存快照保存失败: {e}')
+
+            t = threading.Thread(target=run, name='cache-snapshot')
+            t.daemon = True
+            t.start()
+            atexit.register(close)
+            self.__snapshot = t
+            return t
 
 
 cache = None
@@ -91,14 +604,26 @@ def get_cache():
     return cache
 
 
-def set(key: str, value, *, expire: int = None):
-    return get_cache().set(key, value, expire=expire)
+def set(key: str, value, *, expire: int = None, expire_at: float = None):
+    return get_cache().set(key, value, expire=expire, expire_at=expire_at)
+
+
+def set_many(mapping: dict, *, expire: int = None, expire_at: float = None):
+    return get_cache().set_many(mapping, expire=expire, expire_at=expire_at)
 
 
 def get(key):
     return get_cache().get(key)
 
 
+def get_many(keys: list):
+    return get_cache().get_many(keys)
+
+
+def get_or_set(key: str, factory, *, expire: int = None, expire_at: float = None):
+    return get_cache().get_or_set(key, factory, expire=expire, expire_at=expire_at)
+
+
 def exist(key):
     return get_cache().exist(key)
 
@@ -107,6 +632,52 @@ def delete(key):
     return get_cache().delete(key)
 
 
+def delete_many(keys: list):
+    return get_cache().delete_many(keys)
+
+
+def configure(
+        *,
+        max_entries: int = None, max_bytes: int = None, policy: str = 'lru', sizeof=None,
+        shards: int = SHARDS,
+):
+    return get_cache().configure(
+        max_entries=max_entries, max_bytes=max_bytes, policy=policy, sizeof=sizeof, shards=shards,
+    )
+
+
+def stats():
+    return get_cache().stats()
+
+
+def dump(path: str):
+    return get_cache().dump(path)
+
+
+def load(path: str):
+    return get_cache().load(path)
+
+
+def start_snapshot(path: str, interval: int = 60, *, restore: bool = True):
+    return get_cache().start_snapshot(path, interval, restore=restore)
+
+
+_next_midnight = 0.0  # 次日零点，过了该时间点后重新计算
+
+
+def today_deadline() -> float:
+    """
+    当天失效的时间点（次日零点），只在跨天后重新计算
+    :return:
+    """
+    global _next_midnight
+    midnight = _next_midnight
+    if time.time() >= midnight:  # 与零点比较，跨天后第1秒内写入的值不会沿用前一天的失效时间
+        next_date = util.get_delay_date(delay=1)
+        midnight = _next_midnight = util.str2time(next_date, fmt="%Y-%m-%d")
+    return midnight + 1  # 增加1秒的缓冲
+
+
 def set_cache_expire_today(key, value):
     """
     设置当天失效的缓存
@@ -114,6 +685,97 @@ def set_cache_expire_today(key, value):
     :param value:
     :return:
     """
-    next_date = util.get_delay_date(delay=1)
-    today_expire = util.str2time(next_date, fmt="%Y-%m-%d") - util.str2time()
-    set(key, value, expire=int(today_expire) + 1)  # 增加1秒的缓冲
+    set(key, value, expire_at=today_deadline())
+
+
+if __name__ == '__main__':
+    # 不同线程数下的吞吐量、批量接口的单key耗时：python -m utils.cache
+    import random
+    import timeit
+    from concurrent.futures import ThreadPoolExecutor
+
+    def bench_batch(size: int = 50, number: int = 2000):
+        cache_obj = get_cache()
+        cache_obj.configure()
+        keys = [f'batch_{i}' for i in range(size)]
+        mapping = {k: k for k in keys}
+        cases = {
+            'set': lambda: [cache_obj.set(k, v) for k, v in mapping.items()],
+            'set_many': lambda: cache_obj.set_many(mapping),
+            'get': lambda: [cache_obj.get(k) for k in keys],
+            'get_many': lambda: cache_obj.get_many(keys),
+            'delete': lambda: [cache_obj.delete(k) for k in keys],
+            'delete_many': lambda: cache_obj.delete_many(keys),
+        }
+        for name, func in cases.items():
+            if name.startswith('delete'):  # 删除前先写入
+                spent = sum(timeit.timeit(func, setup=lambda: cache_obj.set_many(mapping), number=1)
+                            for _ in range(number))
+            else:
+                spent = timeit.timeit(func, number=number)
+            print(f'{name:<12} {spent / number / size * 1e9:>8.0f} ns/key')
+
+        spent = timeit.timeit(lambda: set_cache_expire_today('today', 1), number=number)
+        print(f'{"set_cache_expire_today":<12} {spent / number * 1e9:>8.0f} ns/call')
+
+    def bench(threads: int, shards: int, ops: int = 20000):
+        cache_obj = get_cache()
+        cache_obj.configure(shards=shards)
+        keys = [f'key_{i}' for i in range(10000)]
+        for k in keys:
+            cache_obj.set(k, k)
+
+        def worker():
+            rnd = random.Random()
+            for _ in range(ops):
+                k = keys[rnd.randrange(len(keys))]
+                if rnd.random() < 0.8:
+                    cache_obj.get(k)
+                else:
+                    cache_obj.set(k, k, expire=60)
+
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            for future in [executor.submit(worker) for _ in range(threads)]:
+                future.result()
+        spent = time.time() - start
+        return threads * ops / spent
+
+    def check_today_deadline():
+        """跨天后的第1秒内，失效时间应为新的次日零点"""
+        global _next_midnight
+        _next_midnight = time.time() - 0.5  # 模拟刚过零点
+        deadline = today_deadline()
+        assert deadline > time.time() + 1, deadline
+        assert deadline == util.str2time(util.get_delay_date(delay=1), fmt="%Y-%m-%d") + 1
+        print('today deadline after midnight ok')
+
+    def check_reaper():
+        """重建堆后推入更早的失效时间也要唤醒线程；fork出的子进程中仍能清理"""
+        expired = []
+        reaper = _Reaper(lambda key, expire: expired.append(key))
+        for i in range(159):  # 重复set同一批key，使下一次push触发_compact
+            reaper.push(f'late_{i % 10}', time.time() + 3600)
+        time.sleep(0.05)  # 线程已按最早的late_*进入等待
+        reaper.push('late_0', time.time() + 0.05)  # 已有的key改为很快失效
+        time.sleep(0.3)
+        assert expired == ['late_0'], expired
+        print('reaper wake after compact ok')
+
+        if hasattr(os, 'fork'):
+            reaper.push('child', time.time() + 0.05)
+            pid = os.fork()
+            if pid == 0:
+                time.sleep(0.3)
+                reaper.push('child_new', time.time() + 0.05)
+                time.sleep(0.3)
+                os._exit(0 if expired[-2:] == ['child', 'child_new'] else 1)
+            _, status = os.waitpid(pid, 0)
+            assert status == 0, status
+            print('reaper after fork ok')
+
+    check_today_deadline()
+    check_reaper()
+    bench_batch()
+    for n in (1, 2, 4, 8, 16, 32, 64):
+        print(f'threads={n:<3} ' + '  '.join(f'shards={s}: {bench(n, s):>10.0f} ops/s' for s in (1, SHARDS)))
@@ -0,0 +1,250 @@
+#!-*- coding:utf-8 -*-
+# python3.7
+# CreateTime: 2026/10/18 10:12
+# FileName: 缓存淘汰策略
+
+import random
+import sys
+from collections import OrderedDict
+
+
+class Policy:
+    """
+    淘汰策略。只记录key的访问情况，由缓存在超出容量时调用evict获取被淘汰的key
+    """
+
+    def record(self, key):
+        """命中（或覆盖写入）已存在的key"""
+        raise NotImplementedError
+
+    def insert(self, key):
+        """写入新的key"""
+        raise NotImplementedError
+
+    def remove(self, key):
+        """key被删除（主动删除或失效）"""
+        raise NotImplementedError
+
+    def evict(self):
+        """选出并移除一个被淘汰的key"""
+        raise NotImplementedError
+
+
+class LRUPolicy(Policy):
+    """最近最少使用"""
+
+    def __init__(self, **kwargs):
+        self._keys = OrderedDict()
+
+    def record(self, key):
+        self._keys.move_to_end(key)
+
+    def insert(self, key):
+        self._keys[key] = None
+
+    def remove(self, key):
+        self._keys.pop(key, None)
+
+    def evict(self):
+        key, _ = self._keys.popitem(last=False)
+        return key
+
+
+class LFUPolicy(Policy):
+    """最不经常使用。频次相同时淘汰最久未使用的key"""
+
+    def __init__(self, **kwargs):
+        self._freq = {}  # key: 访问次数
+        self._buckets = {}  # 访问次数: OrderedDict(key)
+        self._min_freq = 0
+
+    def __move(self, key, freq, new_freq):
+        bucket = self._buckets[freq]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[freq]
+            if self._min_freq == freq:
+                self._min_freq = new_freq
+        self._buckets.setdefault(new_freq, OrderedDict())[key] = None
+        self._freq[key] = new_freq
+
+    def record(self, key):
+        freq = self._freq[key]
+        self.__move(key, freq, freq + 1)
+
+    def insert(self, key):
+        self._freq[key] = 1
+        self._buckets.setdefault(1, OrderedDict())[key] = None
+        self._min_freq = 1
+
+    def remove(self, key):
+        freq = self._freq.pop(key, None)
+        if freq is None:
+            return
+        bucket = self._buckets[freq]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[freq]
+            if self._min_freq == freq:
+                self._min_freq = min(self._buckets) if self._buckets else 0
+
+    def evict(self):
+        bucket = self._buckets[self._min_freq]
+        key, _ = bucket.popitem(last=False)
+        del self._freq[key]
+        if not bucket:
+            del self._buckets[self._min_freq]
+            self._min_freq = min(self._buckets) if self._buckets else 0
+        return key
+
+
+class CountMinSketch:
+    """
+    频次估计（4位计数器，定期减半以淡化历史访问）
+    """
+
+    depth = 4
+    max_count = 15
+
+    def __init__(self, width: int = 1024):
+        width = 1 << max(int(width) - 1, 15).bit_length()  # 2的幂，便于取模
+        self._mask = width - 1
+        self._table = [[0] * width for _ in range(self.depth)]
+        self._seeds = [random.getrandbits(32) for _ in range(self.depth)]
+        self._samples = 0
+        self._sample_size = 10 * width
+
+    def __indexes(self, key):
+        h = hash(key)
+        return [hash((seed, h)) & self._mask for seed in self._seeds]
+
+    def increment(self, key):
+        for row, index in zip(self._table, self.__indexes(key)):
+            if row[index] < self.max_count:
+                row[index] += 1
+        self._samples += 1
+        if self._samples >= self._sample_size:
+            self.__reset()
+
+    def frequency(self, key) -> int:
+        return min(row[index] for row, index in zip(self._table, self.__indexes(key)))
+
+    def __reset(self):
+        for row in self._table:
+            for i, count in enumerate(row):
+                row[i] = count >> 1
+        self._samples //= 2
+
+
+class TinyLFUPolicy(Policy):
+    """
+    W-TinyLFU：新key先进入窗口LRU，被挤出窗口后进入主区（SLRU）试用；
+    缓存满需要淘汰时，刚进入主区的key与主区的淘汰候选比较估计频次，频次低者被淘汰
+    """
+
+    window_ratio = 0.01
+    protected_ratio = 0.8
+
+    def __init__(self, *, max_entries: int = None, **kwargs):
+        self._window = OrderedDict()
+        self._probation = OrderedDict()
+        self._protected = OrderedDict()
+        self._sketch = CountMinSketch(max_entries or 4096)
+        self._candidate = None  # 上次淘汰后，从窗口进入主区的key
+
+    def __len__(self):
+        return len(self._window) + len(self._probation) + len(self._protected)
+
+    def record(self, key):
+        self._sketch.increment(key)
+        if key in self._window:
+            self._window.move_to_end(key)
+        elif key in self._protected:
+            self._protected.move_to_end(key)
+        elif key in self._probation:  # 试用区再次命中，晋升至保护区
+            del self._probation[key]
+            if key == self._candidate:
+                self._candidate = None
+            self._protected[key] = None
+            max_protected = int((len(self._probation) + len(self._protected)) * self.protected_ratio)
+            while len(self._protected) > max(max_protected, 1):
+                demoted, _ = self._protected.popitem(last=False)
+                self._probation[demoted] = None
+
+    def insert(self, key):
+        self._sketch.increment(key)
+        self._window[key] = None
+        while len(self._window) > max(int(len(self) * self.window_ratio), 1):
+            candidate, _ = self._window.popitem(last=False)
+            self._probation[candidate] = None
+            self._candidate = candidate
+
+    def remove(self, key):
+        if key == self._candidate:
+            self._candidate = None
+        for segment in (self._window, self._probation, self._protected):
+            if key in segment:
+                del segment[key]
+                return
+
+    def __victim(self):
+        for segment in (self._probation, self._protected):
+            for key in segment:
+                if key != self._candidate:
+                    return key, segment
+        if self._candidate is not None:
+            return self._candidate, self._probation
+        return next(iter(self._window)), self._window
+
+    def evict(self):
+        victim, segment = self.__victim()
+        candidate, self._candidate = self._candidate, None
+        if candidate is not None and candidate != victim \
+                and self._sketch.frequency(candidate) <= self._sketch.frequency(victim):
+            victim, segment = candidate, self._probation  # 准入失败，淘汰新进入主区的key
+        del segment[victim]
+        return victim
+
+
+POLICIES = {
+    'lru': LRUPolicy,
+    'lfu': LFUPolicy,
+    'tinylfu': TinyLFUPolicy,
+}
+
+
+def get_policy(name: str, **kwargs) -> Policy:
+    """
+
+    :param name: lru、lfu、tinylfu
+    :param kwargs: 策略参数
+    :return:
+    """
+    name = name.lower().replace('-', '').replace('_', '')
+    if name == 'wtinylfu':
+        name = 'tinylfu'
+    if name not in POLICIES:
+        raise Exception(f'{name} 淘汰策略暂不支持')
+    return POLICIES[name](**kwargs)
+
+
+def sizeof(obj, seen: set = None) -> int:
+    """
+    对象占用内存的估算（字节），递归计算常见容器
+    :param obj:
+    :param seen: 已计算的对象id，避免循环引用
+    :return:
+    """
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(sizeof(k, seen) + sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(sizeof(item, seen) for item in obj)
+    elif hasattr(obj, '__dict__'):
+        size += sizeof(obj.__dict__, seen)
+    return size
@@ -8,7 +8,7 @@ from functools import wraps
 from typing import List, Union, Callable
 import inspect
 
-from utils import log_sls
+from utils import log_sls, cache, thread_func, util
 
 
 def func_log(__module__, __content__: str = '', *, ignore_args: List = None):
@@ -144,3 +144,144 @@ def catch_error(
         return decorated_func
 
     return do
+
+
+class _Flight:
+    """同一个key正在进行的计算"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _has_default_repr(value) -> bool:
+    """repr中是否含有内存地址（object.__repr__），容器逐个检查"""
+    if isinstance(value, dict):
+        return any(_has_default_repr(k) or _has_default_repr(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return any(_has_default_repr(item) for item in value)
+    return type(value).__repr__ is object.__repr__
+
+
+def cached(
+        ttl: int = None, *,
+        key: Union[str, Callable] = None,
+        prefix: str = None,
+        stale_ttl: int = 0,
+):
+    """
+    基于utils.cache的结果缓存。同一个key并发未命中时只计算一次，其余线程等待该结果
+    :param ttl: 缓存有效时间（秒），为空则不失效
+    :param key: 缓存key。模板字符串（'user:{user_id}'，按参数名格式化）或方法（参数同被装饰的函数）；为空则由全部参数生成。
+        参数中有未定义__repr__的对象（如方法的self）时必须指定：默认的repr含内存地址，对象释放后地址会被复用
+    :param prefix: 默认key的前缀，默认为函数的模块及名称
+    :param stale_ttl: 过期后仍可返回旧值的时间（秒）。期间返回旧值，并在后台刷新
+    :return:
+    """
+    stale_ttl = max(stale_ttl, 0)
+
+    def do(func):
+        sig = inspect.signature(func)
+        key_prefix = prefix or f'{func.__module__}.{func.__qualname__}'
+        flights = {}  # key: _Flight
+        refreshing = set()  # 正在后台刷新的key
+        flights_lock = threading.Lock()
+
+        def build_key(*args, **kwargs) -> str:
+            if callable(key):
+                return key(*args, **kwargs)
+            bound = sig.bind(*args, **kwargs)
+            bound.apply_defaults()
+            if isinstance(key, str):
+                return key.format(**bound.arguments)
+            for name, value in bound.arguments.items():
+                if _has_default_repr(value):
+                    raise Exception(f'{func.__qualname__} 的参数 {name} 没有定义__repr__，无法生成缓存key，请指定key')
+            return f'{key_prefix}:{util.md5(repr(tuple(bound.arguments.items())))}'
+
+        def compute(cache_key, args, kwargs):
+            with flights_lock:
+                flight = flights.get(cache_key)
+                leader = flight is None
+                if leader:
+                    flight = flights[cache_key] = _Flight()
+
+            if not leader:
+                flight.event.wait()
+                if flight.error is not None:
+                    raise flight.error
+                return flight.result
+
+            try:
+                item = cache.get(cache_key)
+                if item is not None and time.time() < item['fresh']:  # 上一次计算刚完成，直接使用
+                    flight.result = item['value']
+                    return flight.result
+                flight.result = func(*args, **kwargs)
+                expire = ttl + stale_ttl if ttl else None
+                cache.set(cache_key, {
+                    'value': flight.result,
+                    'fresh': time.time() + ttl if ttl else float('inf'),
+                }, expire=expire)
+                return flight.result
+            except Exception as e:
+                flight.error = e
+                raise
+            finally:
+                with flights_lock:
+                    del flights[cache_key]
+                flight.event.set()
+
+        def refresh(cache_key, args, kwargs):
+            try:
+                compute(cache_key, args, kwargs)
+            except Exception as e:
+                log_sls.error('cached', '后台刷新缓存失败', func=func.__name__, key=cache_key, e=str(e))
+            finally:
+                with flights_lock:
+                    refreshing.discard(cache_key)
+
+        @wraps(func)
+        def decorated_func(*args, **kwargs):
+            cache_key = build_key(*args, **kwargs)
+            item = cache.get(cache_key)
+            if item is None:
+                return compute(cache_key, args, kwargs)
+
+            if time.time() >= item['fresh']:  # 已过期，返回旧值并后台刷新
+                with flights_lock:
+                    submit = cache_key not in refreshing and cache_key not in flights
+                    if submit:
+                        refreshing.add(cache_key)
+                if submit:
+                    try:
+                        thread_func.submit(_get_refresh_pool(), refresh, cache_key, args, kwargs)
+                    except Exception as e:  # 线程池已关闭等，提交失败时允许下次再刷新，仍返回旧值
+                        with flights_lock:
+                            refreshing.discard(cache_key)
+                        log_sls.error('cached', '提交后台刷新失败', func=func.__name__, key=cache_key, e=str(e))
+            return item['value']
+
+        def invalidate(*args, **kwargs) -> bool:
+            """删除指定参数对应的缓存"""
+            return cache.delete(build_key(*args, **kwargs))
+
+        decorated_func.cache_key = build_key
+        decorated_func.invalidate = invalidate
+        return decorated_func
+
+    return do
+
+
+_refresh_pool = None
+_refresh_pool_lock = threading.Lock()
+
+
+def _get_refresh_pool():
+    global _refresh_pool
+    if _refresh_pool is None:
+        with _refresh_pool_lock:
+            if _refresh_pool is None:
+                _refresh_pool = thread_func.ThreadPool('cache-refresh', maxsize=4)
+    return _refresh_pool